@@ -1,9 +1,12 @@
 import sys
+from multiprocessing import freeze_support
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QApplication
 from widgets_main_window import ModernWindow
 
 if __name__ == "__main__":
+    # 打包后分组计算的多进程汇总需要
+    freeze_support()
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
     # 设置应用程序图标（影响任务栏和所有窗口）
@@ -13,6 +13,13 @@ class ConfigDict(TypedDict):
     window_position: Tuple[int, int]
     today_count: int
     last_count_day: int  # 仅用于每日重置
+    group_workers: int  # 分组计算的工作进程数，1 为单进程
+    group_writer: str  # 输出结果.xlsx 写出后端：xlsxwriter / openpyxl
+    group_preload: bool  # 后台预读分组计算用到的文件
+    group_profile: bool  # 分组计算时开启 cProfile，结果写入 输出结果.profile.json
+    group_trace_memory: bool  # 分组计算时开启 tracemalloc 记录内存峰值
+    group_export: str  # 分组结果导出到列式存储：sqlite / parquet，为空时不导出
+    group_export_dir: str  # 导出目录，为空时使用 D:/data/export
 
 
 CONFIG_PATH = Path("D:/data/config.json")
@@ -24,7 +31,14 @@ DEFAULT_CONFIG: ConfigDict = {
     "switch3_state": True,
     "window_position": [200, 200],
     "today_count": 0,
-    "last_count_day": 0  # 仅记录日期
+    "last_count_day": 0,  # 仅记录日期
+    "group_workers": 1,
+    "group_writer": "xlsxwriter",
+    "group_preload": True,
+    "group_profile": False,
+    "group_trace_memory": False,
+    "group_export": "",
+    "group_export_dir": ""
 }
 
 # 线程安全的全局状态
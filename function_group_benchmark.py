@@ -0,0 +1,367 @@
+# function_group_benchmark.py
+"""
+分组计算基准测试
+
+生成指定规模的模拟数据（1.xlsx / 编码对应关系.xlsx / 副表.xlsx），分别计时
+load_data、process_data、create_output_excel 三个阶段，记录吞吐量和内存峰值，
+每次运行追加一行 JSON 到结果文件，便于比较不同版本：
+    python function_group_benchmark.py --rows 10000 100000 1000000 --repeat 3
+
+同一规模、同一随机种子且当天已生成的数据直接复用（波次编号含当天日期，隔天需重新生成）。
+内存峰值由计时之后单独的一轮 tracemalloc 测得，不影响计时结果。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from function_group_calculation import ExcelContrastProcessor
+from function_group_sub_table import clear_sub_table_cache
+from function_reference_cache import ReferenceCache, clear_memory_cache
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# 生成数据的格式版本，生成逻辑变化时递增，旧数据自动重新生成
+DATASET_VERSION = 1
+DATASET_META = "dataset.json"
+
+CHANNELS = ["自营", "分销", "代发"]
+ORDER_TYPES = ["网店销售", "订单补发", "批采"]
+OUTPUT_ORDER_TYPES = {"网店销售": "新订单", "订单补发": "补发单", "批采": "批采单"}
+STAGES = ("load_data", "process_data", "create_output_excel")
+
+
+def dataset_paths(directory, order_format="xlsx"):
+    """数据目录下的 (订单文件, 编码对应关系, 副表, 输出结果)"""
+    return (
+        os.path.join(directory, f"1.{order_format}"),
+        os.path.join(directory, "编码对应关系.xlsx"),
+        os.path.join(directory, "副表.xlsx"),
+        os.path.join(directory, "输出结果.xlsx"),
+    )
+
+
+def _code_pool(rng, codes, size):
+    """
+    货品商家编码取值池：单编码、带数量的单编码、复合编码（A*2;B）和少量未登记编码
+
+    实际导出中同一编码写法会大量重复，订单行从池中抽取。
+    """
+    pool = []
+    for _ in range(size):
+        kind = rng.random()
+        if kind < 0.55:
+            pool.append(str(rng.choice(codes)))
+        elif kind < 0.65:
+            pool.append(f"{rng.choice(codes)}*{rng.integers(2, 4)}")
+        elif kind < 0.97:
+            parts = rng.choice(codes, size=rng.integers(2, 4), replace=False)
+            pool.append(";".join(
+                f"{code}*{rng.integers(1, 4)}" if rng.random() < 0.5 else str(code) for code in parts
+            ))
+        else:
+            pool.append(f"UNKNOWN{rng.integers(0, 1000):03d}")
+    return pool
+
+
+def generate_dataset(directory, rows, shops=300, styles=80, seed=0, order_format="xlsx"):
+    """
+    生成一套模拟数据
+
+    :param rows: 1.xlsx 的数据行数
+    :param shops: 店铺数，按 自营 / 分销 / 代发 轮流分配，另有少量未配置映射的店铺
+    :param styles: 款式数，每个款式 1~3 个编码
+    :param order_format: 订单文件格式 xlsx / csv
+    :return: 数据说明（同时写入 dataset.json）
+    """
+    os.makedirs(directory, exist_ok=True)
+    order_path, reference_path, sub_table_path, _ = dataset_paths(directory, order_format)
+    rng = np.random.default_rng(seed)
+    now = datetime.now()
+    wave_prefix = "PB" + now.strftime("%y%m%d")
+    yesterday_prefix = "PB" + (now - timedelta(days=1)).strftime("%y%m%d")
+
+    # 编码对应关系：款式编码、优先级、排序
+    code_rows = []
+    for style in range(styles):
+        priority = int(rng.integers(1, 6))
+        for letter in "ABC"[:rng.integers(1, 4)]:
+            code_rows.append([f"K{style:03d}{letter}", f"款式{style:03d}", priority, style + 1])
+    code_rows.append(["刷单", "刷单款式", 99, styles + 1])
+    codes = [row[0] for row in code_rows[:-1]]
+
+    mapping_rows = [[f"{channel}/", order_type, channel, OUTPUT_ORDER_TYPES[order_type]]
+                    for channel in CHANNELS for order_type in ORDER_TYPES]
+    color_df = pd.DataFrame(
+        [["自营", "EB5050", "新订单", "46C26F"], ["分销", "F0A800", "补发单", "F0A800"], ["代发", "9999FF", "批采单", "9999FF"]],
+        columns=["输出渠道", "颜色", "输出类型", "颜色.1"]
+    )
+    color_df.columns = ["输出渠道", "颜色", "输出类型", "颜色"]
+    with pd.ExcelWriter(reference_path) as writer:
+        pd.DataFrame(mapping_rows, columns=["渠道", "类型", "输出渠道", "输出类型"]).to_excel(writer, sheet_name="映射", index=False)
+        pd.DataFrame(code_rows, columns=["货品商家编码", "名称", "优先级", "排序"]).to_excel(writer, sheet_name="编码", index=False)
+        color_df.to_excel(writer, sheet_name="颜色", index=False)
+
+    # 波次约每 500 行一个，另有 2% 的行属于前一天的波次
+    wave_count = max(20, rows // 500)
+    waves = np.array([f"{wave_prefix}{i:04d}" for i in range(1, wave_count + 1)]
+                     + [f"{yesterday_prefix}{i:04d}" for i in range(1, 3)], dtype=object)
+    wave_weights = np.full(len(waves), 0.98 / wave_count)
+    wave_weights[-2:] = 0.01
+
+    # 店铺：按渠道轮流分配，0.5% 的行来自没有映射的店铺
+    shop_names = np.array([f"{CHANNELS[i % len(CHANNELS)]}/店铺{i:04d}" for i in range(shops)]
+                          + ["测试店铺"], dtype=object)
+    shop_weights = np.full(len(shop_names), 0.995 / shops)
+    shop_weights[-1] = 0.005
+
+    pool = np.array(_code_pool(rng, codes, max(200, min(20000, rows // 50))), dtype=object)
+    clerks = np.array([f"打单员{i}" for i in range(1, 9)] + ["拣货员"], dtype=object)
+    clerk_weights = np.full(len(clerks), 0.9 / 8)
+    clerk_weights[-1] = 0.1
+
+    orders = pd.DataFrame({
+        "订单编号": np.char.add("T", np.arange(rows).astype(str)),
+        "打印波次": rng.choice(waves, size=rows, p=wave_weights),
+        "店铺": rng.choice(shop_names, size=rows, p=shop_weights),
+        "货品商家编码": rng.choice(pool, size=rows),
+        "订单类型": rng.choice(np.array(ORDER_TYPES, dtype=object), size=rows, p=[0.8, 0.15, 0.05]),
+        "打单员": rng.choice(clerks, size=rows, p=clerk_weights),
+        "数量": rng.integers(1, 5, size=rows),
+    })
+    if order_format == "csv":
+        orders.to_csv(order_path, index=False, encoding="utf-8-sig")
+    else:
+        # pandas 按列写出，不能使用 xlsxwriter 的 constant_memory 模式
+        engine = "xlsxwriter" if xlsxwriter is not None else "openpyxl"
+        with pd.ExcelWriter(order_path, engine=engine) as writer:
+            orders.to_excel(writer, sheet_name="Sheet1", index=False)
+
+    # 副表：约 5% 的当天波次排除、3% 刷单
+    today_waves = waves[:wave_count]
+    picked = rng.permutation(today_waves)
+    excluded = list(picked[:max(1, wave_count // 20)])
+    brush = list(picked[len(excluded):len(excluded) + max(1, wave_count * 3 // 100)])
+    sub_df = pd.DataFrame({"排除": pd.Series(excluded, dtype=object), "刷单": pd.Series(brush, dtype=object)})
+    sub_df.to_excel(sub_table_path, sheet_name="副表数据", index=False)
+
+    meta = {
+        "version": DATASET_VERSION,
+        "date": now.strftime("%Y-%m-%d"),
+        "rows": rows,
+        "shops": shops,
+        "styles": styles,
+        "codes": len(codes),
+        "waves": wave_count,
+        "excluded_waves": len(excluded),
+        "brush_waves": len(brush),
+        "seed": seed,
+        "order_format": order_format,
+    }
+    with open(os.path.join(directory, DATASET_META), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+def ensure_dataset(directory, rows, shops=300, styles=80, seed=0, order_format="xlsx"):
+    """数据已存在且参数一致（并且是当天生成的）时直接复用，否则重新生成"""
+    try:
+        with open(os.path.join(directory, DATASET_META), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        expected = {"version": DATASET_VERSION, "date": datetime.now().strftime("%Y-%m-%d"), "rows": rows,
+                    "shops": shops, "styles": styles, "seed": seed, "order_format": order_format}
+        if all(meta.get(key) == value for key, value in expected.items()) and \
+                all(os.path.exists(path) for path in dataset_paths(directory, order_format)[:3]):
+            return meta
+    except Exception:
+        pass
+    return generate_dataset(directory, rows, shops, styles, seed, order_format)
+
+
+def clear_caches(reference_path):
+    """删除编码对应关系缓存（文件和内存）并清空副表缓存，使 load_data 完整解析各文件"""
+    try:
+        os.remove(ReferenceCache(reference_path).cache_path)
+    except OSError:
+        pass
+    clear_memory_cache()
+    clear_sub_table_cache()
+
+
+def run_stages(directory, order_format="xlsx", workers=1, writer="xlsxwriter", cold=True):
+    """
+    依次运行三个阶段
+
+    :param cold: 为True时先清除缓存，load_data 包含完整的 Excel 解析
+    :return: ({阶段: 用时秒数}, {阶段: 行数})
+    """
+    order_path, reference_path, sub_table_path, output_path = dataset_paths(directory, order_format)
+    if cold:
+        clear_caches(reference_path)
+    processor = ExcelContrastProcessor(order_path, reference_path, sub_table_path, output_path)
+    processor.workers = workers
+    processor.writer_backend = writer
+
+    timings = {}
+    start = time.perf_counter()
+    df1, error = processor.load_data()
+    timings["load_data"] = time.perf_counter() - start
+    if error:
+        raise RuntimeError(error)
+
+    start = time.perf_counter()
+    result = processor.process_data(df1)
+    timings["process_data"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processor.create_output_excel(result["data"])
+    timings["create_output_excel"] = time.perf_counter() - start
+
+    report = processor.validation_report
+    stage_rows = {
+        "load_data": report.total_rows,
+        "process_data": report.kept_rows,
+        "create_output_excel": len(result["data"]),
+    }
+    return timings, stage_rows
+
+
+def measure_memory(directory, order_format="xlsx", workers=1, writer="xlsxwriter", cold=True):
+    """用 tracemalloc 测量各阶段的内存峰值（字节），返回 {阶段: 峰值}"""
+    order_path, reference_path, sub_table_path, output_path = dataset_paths(directory, order_format)
+    if cold:
+        clear_caches(reference_path)
+    processor = ExcelContrastProcessor(order_path, reference_path, sub_table_path, output_path)
+    processor.workers = workers
+    processor.writer_backend = writer
+
+    peaks = {}
+    tracemalloc.start()
+    try:
+        df1, error = processor.load_data()
+        peaks["load_data"] = tracemalloc.get_traced_memory()[1]
+        if error:
+            raise RuntimeError(error)
+
+        tracemalloc.reset_peak()
+        result = processor.process_data(df1)
+        peaks["process_data"] = tracemalloc.get_traced_memory()[1]
+
+        tracemalloc.reset_peak()
+        processor.create_output_excel(result["data"])
+        peaks["create_output_excel"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def code_version():
+    """当前代码的 git 提交，无法取得时返回None"""
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return output.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def benchmark(directory, rows, repeat=3, seed=0, order_format="xlsx", workers=1, writer="xlsxwriter",
+              cold=True, memory=True, report=print):
+    """
+    生成（或复用）数据并运行基准测试
+
+    :return: 结果字典，各阶段记录最短 / 中位用时、吞吐量（行/秒，按最短用时）和内存峰值
+    """
+    dataset_dir = os.path.join(directory, f"{order_format}_{rows}_{seed}")
+    start = time.perf_counter()
+    meta = ensure_dataset(dataset_dir, rows, seed=seed, order_format=order_format)
+    report(f"数据准备完成：{rows} 行，用时 {time.perf_counter() - start:.2f} 秒")
+
+    runs = []
+    stage_rows = {}
+    for index in range(repeat):
+        timings, stage_rows = run_stages(dataset_dir, order_format, workers, writer, cold)
+        runs.append(timings)
+        report(f"第 {index + 1} 轮：" + "，".join(f"{stage} {timings[stage]:.3f} 秒" for stage in STAGES))
+
+    peaks = measure_memory(dataset_dir, order_format, workers, writer, cold) if memory else {}
+
+    stages = {}
+    for stage in STAGES:
+        seconds = [run[stage] for run in runs]
+        best = min(seconds)
+        stages[stage] = {
+            "rows": stage_rows.get(stage),
+            "seconds": [round(value, 6) for value in seconds],
+            "best_seconds": round(best, 6),
+            "median_seconds": round(statistics.median(seconds), 6),
+            "rows_per_second": round(stage_rows[stage] / best, 1) if best > 0 and stage_rows.get(stage) else None,
+            "peak_memory_bytes": peaks.get(stage),
+        }
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "code_version": code_version(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "workers": workers,
+        "writer": writer,
+        "cold": cold,
+        "repeat": repeat,
+        "dataset": meta,
+        "stages": stages,
+    }
+
+
+def append_result(results_path, result):
+    """结果以 JSON Lines 追加写入，每次运行一行"""
+    directory = os.path.dirname(os.path.abspath(results_path))
+    os.makedirs(directory, exist_ok=True)
+    with open(results_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分组计算基准测试")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="1.xlsx 行数，可指定多个规模")
+    parser.add_argument("--repeat", type=int, default=3, help="每个规模的计时轮数，默认 3")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子，默认 0")
+    parser.add_argument("--format", choices=["xlsx", "csv"], default="xlsx", help="订单文件格式，默认 xlsx")
+    parser.add_argument("--workers", type=int, default=1, help="汇总的工作进程数，默认 1")
+    parser.add_argument("--writer", default="xlsxwriter", help="输出结果写出后端：xlsxwriter / openpyxl")
+    parser.add_argument("--dir", default="benchmark_data", help="模拟数据目录，默认 ./benchmark_data")
+    parser.add_argument("--results", default="benchmark_results.jsonl", help="结果文件，默认 ./benchmark_results.jsonl")
+    parser.add_argument("--warm", action="store_true", help="保留编码对应关系和副表缓存（默认每轮清除）")
+    parser.add_argument("--no-memory", action="store_true", help="不测量内存峰值")
+    args = parser.parse_args(argv)
+
+    for rows in args.rows:
+        result = benchmark(args.dir, rows, repeat=max(1, args.repeat), seed=args.seed, order_format=args.format,
+                           workers=max(1, args.workers), writer=args.writer, cold=not args.warm,
+                           memory=not args.no_memory)
+        append_result(args.results, result)
+        for stage in STAGES:
+            info = result["stages"][stage]
+            peak = info["peak_memory_bytes"]
+            peak_text = f"，内存峰值 {peak / 1024 / 1024:.1f} MB" if peak is not None else ""
+            print(f"{rows} 行 {stage}: {info['best_seconds']:.3f} 秒，{info['rows_per_second']} 行/秒{peak_text}")
+    print(f"结果已追加到 {args.results}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,54 +1,208 @@
 import pandas as pd
-from collections import defaultdict
 import os
 from datetime import datetime
 import time
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill
+from openpyxl.styles import Font
 from function_group_sub_table import SubTableHandler
+from function_group_engine import (GroupAggregator, GroupResult, ParsedCodeCache, UniformSelector, row_samples,
+                                   combine_samples, MAPPING_SAMPLE_SIZE, ROW_SAMPLE_SIZE)
+from function_group_reader import open_order_reader, ORDER_COLUMNS
+from function_reference_cache import ReferenceCache
+from function_group_incremental import IncrementalAggregation
+from function_group_parallel import ParallelAggregation
+from function_group_writer import get_writer, font_rgb
+from function_group_profile import RunProfile, write_sidecar
+from function_group_range import range_days, day_title, expand_inputs, load_files, combine_files
+from function_group_export import export_rows, export_results, new_run_id
+from function_config_manager import load_config
+
+
+class CalculationCancelled(Exception):
+    """分组计算被取消"""
+
+
+# 进度阶段及显示名称
+STAGE_NAMES = {
+    "load": "读取参考数据",
+    "map": "读取并映射订单",
+    "aggregate": "汇总",
+    "write": "写出结果",
+    "export": "导出汇总数据",
+}
+
+# 计时报告中子阶段的显示名称
+SUB_STAGE_NAMES = {
+    "reference": "编码对应关系",
+    "sub_table": "副表",
+    "read": "读取",
+    "feed": "映射",
+    "finish": "合并",
+    "summarize": "整理",
+}
 
 
 class ExcelContrastProcessor:
-    def __init__(self):
+    # 由编码对应关系.xlsx解析得到、可缓存复用的属性
+    REFERENCE_FIELDS = ("code_dict", "priority_dict", "style_sort", "brush_style", "channel_type_map",
+                        "mapping_index", "channel_colors", "order_type_colors")
+
+    def __init__(self, order_path=None, reference_path=None, sub_table_path=None, output_path=None):
+        """各路径未指定时使用桌面上的 1.xlsx / 编码对应关系.xlsx / 副表.xlsx / 输出结果.xlsx"""
         self.desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
+        self.order_path = order_path or os.path.join(self.desktop_path, "1.xlsx")
+        self.reference_path = reference_path or os.path.join(self.desktop_path, "编码对应关系.xlsx")
+        self.output_path = output_path or os.path.join(self.desktop_path, "输出结果.xlsx")
         self.code_dict = {}
         self.priority_dict = {}
+        self.style_sort = {}
+        # 编码对应关系.xlsx各sheet读取用时（秒）
+        self.sheet_timings = {}
+        # 货品商家编码解析缓存
+        self.code_cache = ParsedCodeCache()
+        # 订单文件解析结果缓存（ParsedOrderCache），由常驻的计算服务设置，为None时每次读取文件
+        self.order_cache = None
+        # 编码对应关系.xlsx的文件签名，增量计算据此判断保存的波次结果是否可用
+        self.reference_signature = None
+        # 按波次增量计算：只汇总新增或内容变化的波次
+        self.incremental = True
+        self.incremental_stats = None
+        # 多进程汇总的工作进程数，1 表示单进程
+        config = load_config()
+        self.workers = max(1, int(config.get("group_workers", 1)))
+        # 输出结果.xlsx 的写出后端：xlsxwriter / openpyxl
+        self.writer_backend = config.get("group_writer", "xlsxwriter")
+        # 按 (渠道, 类型, 款式, 波次) 导出到列式存储：sqlite / parquet，为空时不导出
+        self.export_format = config.get("group_export", "")
+        self.export_dir = config.get("group_export_dir", "")
+        # 汇总时是否同时按波次汇总（导出时开启）
+        self.wave_breakdown = bool(self.export_format)
+        # 按波次的汇总结果（GroupAggregator.wave_totals），summarize() 时设置
+        self.wave_totals = None
+        # 导出列式存储失败时的错误信息，calculate() 中设置，附在返回的信息中
+        self.export_error = None
         self.messages = []
         self.today_str = datetime.now().strftime("%y%m%d")
         self.has_unmatched_codes = False
         self.non_today_waves = set()
+        # 是否在结果中提示副表里没有匹配到的波次（日期范围模式按天汇总时关闭，由整个范围统一提示）
+        self.sub_table_warnings = True
+        # 读取订单数据时的校验结果（ValidationReport）
+        self.validation_report = None
+        # 进度回调 callback(阶段, 已读取行数或None) 与取消标志（threading.Event），由界面的后台线程设置
+        self.progress_callback = None
+        self.cancel_event = None
+        # 计算用时（秒），calculate() 完成后设置
+        self.elapsed_time = None
+        # 各阶段计时、计数与可选的 cProfile / tracemalloc，完成后写入 输出结果.profile.json
+        self.profile = RunProfile.from_config(config)
+        self.output_written = False
         self.brush_style = "洗脸巾/其它包数"
         self.COLOR_INFO = "green"
         self.COLOR_WARN = "purple"
         self.COLOR_ERROR = "red"
-        self.unmatched_waves = defaultdict(list)
-        self.partial_unmatched_waves = defaultdict(list)
+        self.unmatched_waves = row_samples(ROW_SAMPLE_SIZE)
+        self.partial_unmatched_waves = row_samples(ROW_SAMPLE_SIZE)
         self.channel_colors = {}
         self.order_type_colors = {}
 
         # 新增：订单类型映射表
         self.channel_type_map = []
+        # 编译后的映射索引 {(渠道, 类型): (输出渠道, 输出类型)}，及本次运行的 店铺 -> 渠道前缀 缓存
+        self.mapping_index = {}
+        self._channel_part_memo = {}
         # 新增：用于跟踪未匹配的映射关系
-        self.unmatched_mappings = defaultdict(list)
+        self.unmatched_mappings = row_samples(MAPPING_SAMPLE_SIZE)
 
         # 初始化副表处理器
-        self.sub_table_handler = SubTableHandler(self.desktop_path)
+        self.sub_table_handler = SubTableHandler(self.desktop_path, sub_table_path)
 
-    def is_empty(self, value):
-        if pd.isna(value):
-            return True
-        if isinstance(value, str) and value.strip() == "":
-            return True
-        return False
+    def load_reference_data(self):
+        """读取编码对应关系.xlsx（映射 / 编码 / 颜色）并加载副表，返回错误信息，成功时返回None"""
+        code_file_path = self.reference_path
 
-    def load_data(self):
-        file1_path = os.path.join(self.desktop_path, "1.xlsx")
-        code_file_path = os.path.join(self.desktop_path, "编码对应关系.xlsx")
+        try:
+            # 编码对应关系.xlsx未变化时直接使用缓存
+            with self.profile.stage("reference"):
+                cache = ReferenceCache(code_file_path)
+                reference = cache.load()
+                self.profile.count("reference_cache_hit", reference is not None)
+                if reference is not None:
+                    self.apply_reference(reference)
+                else:
+                    error = self.parse_reference_workbook(code_file_path)
+                    if error:
+                        return error
+                    cache.save({field: getattr(self, field) for field in self.REFERENCE_FIELDS})
+                self.reference_signature = cache.signature()
+
+            # 加载副表数据 - 使用新的处理器（副表保持单独文件）
+            with self.profile.stage("sub_table"):
+                sub_table_error = self.sub_table_handler.load_sub_table()
+            if sub_table_error:
+                return sub_table_error
+
+            return None
+
+        except Exception as e:
+            return f"读取数据时出错: {str(e)}"
+
+    def apply_reference(self, reference):
+        """使用缓存中的参考数据"""
+        for field in self.REFERENCE_FIELDS:
+            setattr(self, field, reference[field])
+        self._channel_part_memo = {}
+        self.code_cache.bind(self.code_dict, self.priority_dict)
+
+    def shared_context(self):
+        """已加载的参考数据与副表波次，可跨进程传递，用于创建共用参考数据的处理器"""
+        handler = self.sub_table_handler
+        return {
+            "reference": {field: getattr(self, field) for field in self.REFERENCE_FIELDS},
+            "reference_signature": self.reference_signature,
+            "sub_table_path": handler.sub_table_path,
+            "excluded_waves": handler.excluded_waves,
+            "brush_waves": handler.brush_waves,
+            "sub_table_messages": handler.sub_table_messages,
+            "wave_breakdown": self.wave_breakdown,
+        }
+
+    @classmethod
+    def from_context(cls, context, order_path, output_path):
+        """用 shared_context() 的结果创建处理器，不再读取编码对应关系和副表"""
+        processor = cls(order_path=order_path, sub_table_path=context["sub_table_path"], output_path=output_path)
+        processor.apply_reference(context["reference"])
+        processor.reference_signature = context["reference_signature"]
+        handler = processor.sub_table_handler
+        handler.excluded_waves = set(context["excluded_waves"])
+        handler.brush_waves = set(context["brush_waves"])
+        handler.sub_table_messages = list(context["sub_table_messages"])
+        processor.wave_breakdown = context["wave_breakdown"]
+        return processor
+
+    def parse_reference_workbook(self, code_file_path):
+        """
+        解析编码对应关系.xlsx的映射、编码、颜色三个sheet，返回错误信息，成功时返回None
+
+        工作簿只打开一次，三个sheet共用同一个句柄，各sheet读取用时记录在 sheet_timings
+        """
+        self.sheet_timings = {}
+        try:
+            workbook = pd.ExcelFile(code_file_path)
+        except Exception as e:
+            return f"读取映射表时出错: {str(e)}"
+
+        def read_sheet(sheet_name):
+            with self.profile.stage(sheet_name) as timing:
+                sheet_start = time.perf_counter()
+                df = workbook.parse(sheet_name)
+                self.sheet_timings[sheet_name] = time.perf_counter() - sheet_start
+                timing.rows = len(df)
+            return df
 
         try:
             try:
                 # 从"编码对应关系.xlsx"文件的"映射"sheet中读取
-                map_df = pd.read_excel(code_file_path, sheet_name="映射")
+                map_df = read_sheet("映射")
                 self.channel_type_map = []
 
                 # 检查必需的列是否存在
@@ -65,59 +219,32 @@ class ExcelContrastProcessor:
                             })
                 else:
                     missing_cols = [col for col in required_map_columns if col not in map_df.columns]
-                    return None, None, f"映射表中缺少必要的列: {', '.join(missing_cols)}"
+                    return f"映射表中缺少必要的列: {', '.join(missing_cols)}"
 
                 if not self.channel_type_map:
-                    return None, None, "映射表中没有有效数据"
+                    return "映射表中没有有效数据"
+
+                self.build_mapping_index()
 
             except ValueError as e:
                 if "Worksheet named '映射' not found" in str(e):
-                    return None, None, f"编码对应关系.xlsx文件中没有找到'映射'工作表"
+                    return f"编码对应关系.xlsx文件中没有找到'映射'工作表"
                 else:
-                    return None, None, f"读取映射表时出错: {str(e)}"
+                    return f"读取映射表时出错: {str(e)}"
             except Exception as e:
-                return None, None, f"读取映射表时出错: {str(e)}"
-
-            df1 = pd.read_excel(file1_path, sheet_name="Sheet1")
-            required_columns = ['打印波次', '店铺', '货品商家编码', '订单类型', '打单员']
-            missing_columns = [col for col in required_columns if col not in df1.columns]
-            if missing_columns:
-                return None, None, f"1.xlsx中缺少必要的列: {', '.join(missing_columns)}"
-
-            key_columns = ['打印波次', '店铺', '货品商家编码', '订单类型', '打单员']
-            null_rows = df1[df1[key_columns].isnull().any(axis=1)]
-            if not null_rows.empty:
-                null_row_numbers = [idx + 2 for idx in null_rows.index]
-                return None, None, f"发现空值行，行号: {', '.join(map(str, null_row_numbers))}"
-
-            if '打单员' in df1.columns:
-                df1 = df1[df1['打单员'].astype(str).str.contains('打单')]
-
-            current_mmdd = datetime.now().strftime("%m%d")
-            for idx, row in enumerate(df1.itertuples(index=False)):
-                wave_value = getattr(row, '打印波次')
-                if not self.is_empty(wave_value):
-                    wave_str = str(wave_value).strip()
-                    if wave_str.startswith("PB" + datetime.now().strftime("%y")) and len(wave_str) >= 10:
-                        wave_mmdd = wave_str[4:8]
-                        if wave_mmdd != current_mmdd:
-                            self.non_today_waves.add(wave_str)
-
-            if self.non_today_waves:
-                self.messages.append({
-                    "text": f"发现非当天波次，已忽略: {', '.join(sorted(self.non_today_waves))}",
-                    "color": self.COLOR_INFO
-                })
-
-            df_code = pd.read_excel(code_file_path, sheet_name="编码")
+                return f"读取映射表时出错: {str(e)}"
+
+            df_code = read_sheet("编码")
             df_code["优先级"] = df_code["优先级"].ffill()
 
             brush_rows = df_code[df_code["货品商家编码"].astype(str).str.strip() == "刷单"]
             if not brush_rows.empty:
                 self.brush_style = brush_rows.iloc[0]["名称"]
 
+            self.build_code_mappings(df_code)
+
             try:
-                color_df = pd.read_excel(code_file_path, sheet_name="颜色")
+                color_df = read_sheet("颜色")
 
                 # 渠道颜色
                 if "输出渠道" in color_df.columns and "颜色" in color_df.columns:
@@ -137,24 +264,86 @@ class ExcelContrastProcessor:
 
             except ValueError as e:
                 if "Worksheet named '颜色' not found" in str(e):
-                    return None, None, "编码对应关系.xlsx 中未找到 sheet「颜色」"
+                    return "编码对应关系.xlsx 中未找到 sheet「颜色」"
                 else:
-                    return None, None, f"读取颜色配置时出错: {str(e)}"
+                    return f"读取颜色配置时出错: {str(e)}"
             except Exception as e:
-                return None, None, f"读取颜色配置时出错: {str(e)}"
+                return f"读取颜色配置时出错: {str(e)}"
 
-            # 加载副表数据 - 使用新的处理器（副表保持单独文件）
-            sub_table_error = self.sub_table_handler.load_sub_table()
-            if sub_table_error:
-                return None, None, sub_table_error
+            timing_text = "，".join(f"{name} {seconds:.2f} 秒" for name, seconds in self.sheet_timings.items())
+            self.messages.append({
+                "text": f"读取编码对应关系用时：{timing_text}",
+                "color": self.COLOR_INFO
+            })
+            return None
 
-            # 添加副表消息
-            self.messages.extend(self.sub_table_handler.sub_table_messages)
+        except Exception as e:
+            return f"读取数据时出错: {str(e)}"
+        finally:
+            workbook.close()
+
+    def order_reader(self):
+        """创建订单数据的流式读取器（xlsx / csv / parquet / arrow 按扩展名选择）"""
+        if self.order_cache is not None:
+            hits = self.order_cache.hits
+            reader = self.order_cache.reader(self.order_path)
+            self.profile.count("order_cache_hit", self.order_cache.hits > hits)
+            return reader
+        return open_order_reader(self.order_path)
+
+    def finish_reading(self, reader):
+        """
+        读取结束后的校验与提示：缺列、空值行、非当天波次，并追加副表消息
+
+        :return: 错误信息，没有错误时返回None
+        """
+        self.validation_report = reader.report
+        error = self.reading_error(reader)
+        if error:
+            return error
+
+        self.non_today_waves = reader.non_today_waves
+        if self.non_today_waves:
+            self.messages.append({
+                "text": f"发现非当天波次，已忽略: {', '.join(sorted(self.non_today_waves))}",
+                "color": self.COLOR_INFO
+            })
+
+        # 添加副表消息
+        self.messages.extend(self.sub_table_handler.sub_table_messages)
+        return None
+
+    @staticmethod
+    def reading_error(reader):
+        """缺列、空值行的错误信息，没有错误时返回None"""
+        if reader.missing_columns:
+            return f"1.xlsx中缺少必要的列: {', '.join(reader.missing_columns)}"
+
+        if reader.null_rows:
+            null_row_numbers = [idx + 2 for idx in reader.null_rows]
+            return f"发现空值行，行号: {', '.join(map(str, null_row_numbers))}"
+        return None
 
-            return df1, df_code, None
+    def load_data(self):
+        """
+        读取参考数据和全部订单数据（已剔除非打单行和非当天波次）
+
+        :return: (df1, 错误信息)
+        """
+        error = self.load_reference_data()
+        if error:
+            return None, error
 
+        reader = self.order_reader()
+        try:
+            df1 = reader.read_all()
         except Exception as e:
-            return None, None, f"读取数据时出错: {str(e)}"
+            return None, f"读取数据时出错: {str(e)}"
+
+        error = self.finish_reading(reader)
+        if error:
+            return None, error
+        return df1, None
 
     def build_code_mappings(self, df_code):
         self.style_sort = {}
@@ -167,34 +356,41 @@ class ExcelContrastProcessor:
             self.priority_dict[code] = pri
             if name not in self.style_sort or sort_val < self.style_sort[name]:
                 self.style_sort[name] = sort_val
+        self.code_cache.bind(self.code_dict, self.priority_dict)
 
-    def get_mapped_channel_and_type(self, shop, order_type_tag, wave_str, row_idx):
-        """根据店铺和订单类型获取映射后的渠道和类型"""
-        shop = str(shop).strip() if not pd.isna(shop) else ""
-        order_type_tag = str(order_type_tag).strip() if not pd.isna(order_type_tag) else ""
-
-        # 从店铺名中提取渠道部分（第一个/号前的内容）
-        if '/' in shop:
-            channel_part = shop.split('/')[0] + "/"
-        else:
-            channel_part = shop + "/"  # 如果没有斜杠，直接添加斜杠
-
-        # 在映射表中查找匹配项
+    def build_mapping_index(self):
+        """将映射表编译为以(渠道, 类型)为键的字典，重复的组合以映射表中靠前的一条为准"""
+        self.mapping_index = {}
         for mapping in self.channel_type_map:
-            if mapping["渠道"] == channel_part and mapping["类型"] == order_type_tag:
-                return mapping["输出渠道"], mapping["输出类型"]
-
-        # 如果没有找到匹配项，记录到未匹配集合中
-        mapping_key = f"{channel_part}|{order_type_tag}"
-        self.unmatched_mappings[mapping_key].append({
-            "wave": wave_str,
-            "row_idx": row_idx + 2,  # Excel行号（从1开始，加上标题行）
-            "shop": shop,
-            "order_type": order_type_tag
-        })
+            self.mapping_index.setdefault(
+                (mapping["渠道"], mapping["类型"]),
+                (mapping["输出渠道"], mapping["输出类型"])
+            )
+        self._channel_part_memo = {}
 
-        # 返回None表示没有匹配项
-        return None, None
+    def get_channel_part(self, shop):
+        """从店铺名中提取渠道部分（第一个/号前的内容加/），结果按店铺缓存"""
+        channel_part = self._channel_part_memo.get(shop)
+        if channel_part is None:
+            channel_part = shop.split('/')[0] + "/"
+            self._channel_part_memo[shop] = channel_part
+        return channel_part
+
+    def map_channels(self, shops, order_types):
+        """
+        批量映射
+
+        :param shops: 已去除首尾空格的店铺序列
+        :param order_types: 与 shops 等长的订单类型序列
+        :return: [(渠道前缀, (输出渠道, 输出类型) 或 None), ...]
+        """
+        get_channel_part = self.get_channel_part
+        index = self.mapping_index
+        results = []
+        for shop, order_type_tag in zip(shops, order_types):
+            channel_part = get_channel_part(shop)
+            results.append((channel_part, index.get((channel_part, order_type_tag))))
+        return results
 
     def parse_codes_and_quantities(self, product_code):
         # 解析“货品商家编码”字段，支持复合写法，如 "A*2;B*3;C"
@@ -219,149 +415,157 @@ class ExcelContrastProcessor:
 
         return codes, quantities
 
-    class UniformSelector:
-        # 用于在同一波次 / 同一组合下，实现「公平、均匀」的款式选择策略，避免总是选同一个编码。
-        def __init__(self):
-            self.group_state = defaultdict(lambda: {
-                'index': 0,
-                'sorted_codes': None,
-                'counters': defaultdict(int),
-                '_index': 0,
-                'max_qty_codes': None
-            })
-
-        def select(self, candidates, quantities, priority_dict, group_key):
-            if not candidates:
-                return None
-
-            state = self.group_state[group_key]
-            priorities = {priority_dict[code] for code in candidates}
-            same_priority = len(priorities) == 1
-            qty_values = {quantities[code] for code in candidates}
-            same_quantity = len(qty_values) == 1
-
-            if same_priority and same_quantity:
-                if state['sorted_codes'] is None:
-                    state['sorted_codes'] = sorted(candidates)
-                selected_code = state['sorted_codes'][state['index'] % len(state['sorted_codes'])]
-                state['index'] += 1
-                state['counters'][selected_code] += 1
-                return selected_code
-
-            elif same_priority:
-                if state['max_qty_codes'] is None:
-                    max_qty = max(quantities[code] for code in candidates)
-                    state['max_qty_codes'] = [code for code in candidates if quantities[code] == max_qty]
-
-                if len(state['max_qty_codes']) > 1:
-                    selected_code = state['max_qty_codes'][state['_index'] % len(state['max_qty_codes'])]
-                    state['_index'] += 1
-                else:
-                    selected_code = state['max_qty_codes'][0]
-                state['counters'][selected_code] += 1
-                return selected_code
+    # 用于在同一波次 / 同一组合下，实现「公平、均匀」的款式选择策略，避免总是选同一个编码。
+    UniformSelector = UniformSelector
 
-            else:
-                min_priority = min(priority_dict[code] for code in candidates)
-                priority_candidates = [code for code in candidates if priority_dict[code] == min_priority]
-                return self.select(priority_candidates, quantities, priority_dict, group_key)
+    def create_aggregation(self):
+        """按配置创建汇总器：多进程或单进程"""
+        if self.workers > 1:
+            return ParallelAggregation(self, self.workers)
+        return GroupAggregator(self)
 
     def process_data(self, df1):
-        result_data = []
-        selector = self.UniformSelector()
-        excluded_row_count = 0
-        sub_handler = self.sub_table_handler
-        get_mapping = self.get_mapped_channel_and_type
-        wave_stats = {
-            'brush_waves': defaultdict(list)
-        }
-        # 未匹配映射的计数器
-        unmapped_row_count = 0
-
-        max_sort = max(self.style_sort.values()) if self.style_sort else 999
-
-        # 使用 defaultdict 来收集数据
-        group_data = defaultdict(lambda: defaultdict(int))
-
-        for idx, row in df1.iterrows():
-            wave_value = row['打印波次']
-            wave_str = str(wave_value).strip() if not self.is_empty(wave_value) else None
-            shop = str(row.get("店铺", "")).strip()
-            order_type_tag = str(row.get("订单类型", "")).strip()
-            product_code = row["货品商家编码"]
-
-            if wave_str and wave_str in self.non_today_waves:
-                continue
+        # 整列汇总，替代逐行 iterrows
+        aggregation = self.create_aggregation()
+        try:
+            aggregation.feed(df1[ORDER_COLUMNS])
+            return self.summarize(aggregation.finish())
+        finally:
+            if hasattr(aggregation, "close"):
+                aggregation.close()
+
+    def report_progress(self, stage, rows=None):
+        """通知进入某阶段（STAGE_NAMES 的键）；已请求取消时抛出 CalculationCancelled"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise CalculationCancelled()
+        if self.progress_callback is not None:
+            self.progress_callback(stage, rows)
+
+    def process_stream(self, reader):
+        """
+        边读边汇总：读取器产出的每个数据块直接送入汇总器
+
+        :return: (处理结果, 错误信息)
+        """
+        if self.incremental:
+            aggregation = IncrementalAggregation(self, reader)
+        else:
+            aggregation = self.create_aggregation()
+        profile = self.profile
+        try:
+            try:
+                self.report_progress("map", 0)
+                with profile.stage("map") as timing:
+                    chunks = iter(reader.chunks())
+                    while True:
+                        with profile.stage("read"):
+                            chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        with profile.stage("feed"):
+                            aggregation.feed(chunk)
+                        self.report_progress("map", reader.row_count)
+                    timing.rows = reader.row_count
+            except CalculationCancelled:
+                raise
+            except Exception as e:
+                return None, f"读取数据时出错: {str(e)}"
 
-            # 使用映射表获取输出渠道和输出类型
-            output_channel, output_type = get_mapping(
-                shop, order_type_tag, wave_str, idx
-            )
+            error = self.finish_reading(reader)
+            if error:
+                return None, error
 
-            # 如果映射返回None，跳过该行
-            if output_channel is None or output_type is None:
-                unmapped_row_count += 1
-                continue
-
-            # 使用副表处理器检查排除波次
-            if wave_str and sub_handler.is_excluded_wave(wave_str):
-                excluded_row_count += 1
-                continue
-
-            # 使用副表处理器检查刷单波次
-            if wave_str and self.sub_table_handler.is_brush_wave(wave_str):
-                wave_stats['brush_waves'][wave_str].append(idx)
-                style = self.brush_style
-                key = (output_channel, output_type, style)
-                group_data[key]['单量'] += 1
-                group_data[key]['实际数量'] += 1
-            else:
-                code_list, quantities = self.parse_codes_and_quantities(product_code)
-                if not code_list:
-                    self.unmatched_waves[wave_str].append((idx + 2, []))  # 空编码视为未匹配
-                    continue
-
-                unmatched_codes = [code for code in code_list if code not in self.code_dict]
-                if unmatched_codes:
-                    self.has_unmatched_codes = True
-                    if len(unmatched_codes) == len(code_list):
-                        self.unmatched_waves[wave_str].append((idx + 2, unmatched_codes))
-                        continue
-                    else:
-                        self.partial_unmatched_waves[wave_str].append((idx + 2, unmatched_codes))
-
-                valid_codes = [code for code in code_list if code in self.code_dict]
-                if not valid_codes:
-                    continue
-
-                # 为每个有效编码累加实际数量
-                for code in valid_codes:
-                    style = self.code_dict[code]
-                    key = (output_channel, output_type, style)
-                    group_data[key]['实际数量'] += quantities[code]
-
-                # 选择主编码并累加单量
-                min_pri = min(self.priority_dict[c] for c in valid_codes)
-                candidates = [c for c in valid_codes if self.priority_dict[c] == min_pri]
-                group_key = tuple(sorted(candidates))
-                main_code = selector.select(candidates, quantities, self.priority_dict, group_key)
-                if main_code:
-                    main_style = self.code_dict[main_code]
-                    key = (output_channel, output_type, main_style)
-                    group_data[key]['单量'] += 1
+            with profile.stage("aggregate"):
+                try:
+                    self.report_progress("aggregate", reader.row_count)
+                    with profile.stage("finish"):
+                        aggregator = aggregation.finish()
+                except CalculationCancelled:
+                    raise
+                except Exception as e:
+                    return None, f"读取数据时出错: {str(e)}"
+                if self.incremental:
+                    self.incremental_stats = {
+                        "reused_waves": len(aggregation.reused_waves),
+                        "rebuilt_waves": len(aggregation.rebuilt_waves),
+                    }
+                with profile.stage("summarize"):
+                    result = self.summarize(aggregator)
+            self.record_counters(result["data"])
+            return result, None
+        finally:
+            # 取消、读取出错或校验失败时不会调用 finish()，在这里关闭多进程汇总的进程池
+            if hasattr(aggregation, "close"):
+                aggregation.close()
+
+    def record_counters(self, result_data):
+        """记录行数、缓存命中率等计数"""
+        profile = self.profile
+        if self.validation_report is not None:
+            profile.count("validation", self.validation_report.to_dict())
+        profile.count("result_rows", len(result_data))
+        profile.count("code_cache", {
+            "hits": self.code_cache.hits,
+            "misses": self.code_cache.misses,
+            "hit_rate": round(self.code_cache.hit_rate, 4),
+            "entries": len(self.code_cache),
+        })
+        if self.incremental_stats is not None:
+            profile.count("incremental", self.incremental_stats)
+        profile.count("workers", self.workers)
+        profile.count("writer", self.writer_backend)
+
+    def profile_messages(self):
+        """各阶段用时和缓存命中情况的提示消息"""
+        counters = self.profile.counters
+        cache_parts = []
+        if "reference_cache_hit" in counters:
+            cache_parts.append(f"编码对应关系{'命中' if counters['reference_cache_hit'] else '未命中'}")
+        if "order_cache_hit" in counters:
+            cache_parts.append(f"订单文件{'命中' if counters['order_cache_hit'] else '未命中'}")
+        if self.code_cache.hits + self.code_cache.misses:
+            cache_parts.append(f"编码解析命中率 {self.code_cache.hit_rate:.1%}")
+        if self.incremental_stats is not None:
+            reused = self.incremental_stats["reused_waves"]
+            total = reused + self.incremental_stats["rebuilt_waves"]
+            cache_parts.append(f"复用波次 {reused}/{total}")
+        return [
+            {"text": f"各阶段用时：{self.profile.summary_text({**STAGE_NAMES, **SUB_STAGE_NAMES})}",
+             "color": self.COLOR_INFO},
+            {"text": f"缓存：{'，'.join(cache_parts)}", "color": self.COLOR_INFO},
+        ]
+
+    def finish_profile(self):
+        """结束性能分析，已写出输出文件时在旁边写出 JSON 计时报告"""
+        self.profile.stop()
+        if self.output_written:
+            self.profile.count("elapsed_seconds", self.elapsed_time)
+            write_sidecar(self.output_path, self.profile.to_dict())
+
+    def summarize(self, aggregator):
+        """根据汇总器结果生成提示消息和排序后的结果行"""
+        self.unmatched_mappings = aggregator.unmatched_mappings
+        self.unmatched_waves = aggregator.unmatched_waves
+        self.partial_unmatched_waves = aggregator.partial_unmatched_waves
+        self.wave_totals = aggregator.wave_totals
+        unmapped_row_count = aggregator.unmapped_row_count
+        excluded_row_count = aggregator.excluded_row_count
+        self.has_unmatched_codes = aggregator.has_unmatched_codes
+        self.sub_table_handler.mark_processed(aggregator.processed_excluded_waves | aggregator.processed_brush_waves)
 
         # 检查未匹配的映射关系
         if self.unmatched_mappings:
             warning_details = []
 
-            # 按渠道分组显示未匹配的行
-            for mapping_key, rows in self.unmatched_mappings.items():
+            # 按渠道分组显示未匹配的行，各组合按首次出现的行号排列
+            mapping_items = sorted(self.unmatched_mappings.items(), key=lambda item: item[1].rows[0])
+            for mapping_key, sample in mapping_items:
                 channel, order_type = mapping_key.split("|")
-                row_numbers = sorted([r["row_idx"] for r in rows])
+                row_numbers = sample.rows
 
-                # 只显示前10行，避免消息过长
-                if len(row_numbers) > 10:
-                    row_display = f"{', '.join(map(str, row_numbers[:10]))}, ...等{len(row_numbers)}行"
+                # 只显示前10行，避免消息过长（只保留了行号最小的10行和总行数）
+                if sample.count > MAPPING_SAMPLE_SIZE:
+                    row_display = f"{', '.join(map(str, row_numbers[:MAPPING_SAMPLE_SIZE]))}, ...等{sample.count}行"
                 else:
                     row_display = ', '.join(map(str, row_numbers))
 
@@ -377,20 +581,16 @@ class ExcelContrastProcessor:
             })
 
         if self.unmatched_waves:
-            # 汇总所有未匹配的行和编码
-            all_unmatched = []
-            for items in self.unmatched_waves.values():
-                all_unmatched.extend(items)
-
-            all_unmatched_sorted = sorted(all_unmatched, key=lambda x: x[0])
-            unmatched_count = len(all_unmatched_sorted)
+            # 汇总所有波次中未匹配的行和编码（各波次只保留了行号最小的20行和总行数）
+            all_unmatched = combine_samples(self.unmatched_waves.values())
+            unmatched_count = all_unmatched.count
 
             details = []
-            for row, codes in all_unmatched_sorted[:20]:
+            for row, codes in all_unmatched.items():
                 codes_str = ', '.join(codes) if codes else '无编码'
                 details.append(f"行{row}: {codes_str}")
 
-            if unmatched_count > 20:
+            if unmatched_count > ROW_SAMPLE_SIZE:
                 details.append(f"等共 {unmatched_count} 行")
 
             # 使用竖线分隔
@@ -403,19 +603,15 @@ class ExcelContrastProcessor:
 
         if self.partial_unmatched_waves:
             # 汇总所有部分未匹配的行和编码
-            all_partial = []
-            for items in self.partial_unmatched_waves.values():
-                all_partial.extend(items)
-
-            all_partial_sorted = sorted(all_partial, key=lambda x: x[0])
-            partial_count = len(all_partial_sorted)
+            all_partial = combine_samples(self.partial_unmatched_waves.values())
+            partial_count = all_partial.count
 
             details = []
-            for row, codes in all_partial_sorted[:20]:
+            for row, codes in all_partial.items():
                 codes_str = ', '.join(codes)
                 details.append(f"行{row}: {codes_str}")
 
-            if partial_count > 20:
+            if partial_count > ROW_SAMPLE_SIZE:
                 details.append(f"等共 {partial_count} 行")
 
             # 使用竖线分隔
@@ -426,9 +622,9 @@ class ExcelContrastProcessor:
                 "color": self.COLOR_ERROR
             })
 
-        if wave_stats['brush_waves']:
-            brush_waves = sorted(wave_stats['brush_waves'].keys())
-            brush_count = sum(len(rows) for rows in wave_stats['brush_waves'].values())
+        if aggregator.brush_wave_rows:
+            brush_waves = sorted(aggregator.brush_wave_rows.keys())
+            brush_count = sum(aggregator.brush_wave_rows.values())
             self.messages.append({
                 "text": f"已处理 {brush_count} 条刷单波次:{'，'.join(brush_waves)}",
                 "color": self.COLOR_INFO
@@ -443,134 +639,96 @@ class ExcelContrastProcessor:
                 "color": self.COLOR_INFO
             })
 
-        # 获取副表警告信息并添加到主消息中
-        sub_table_warnings = self.sub_table_handler.get_warnings()
-        self.messages.extend(sub_table_warnings)
-
-        # 创建优先级映射（按字母顺序排序）
-        channel_priority = {"自营": 0, "分销": 1, "代发": 2}
-        # 订单类型优先级
-        order_type_priority = {"新订单": 0, "补发单": 1, "批采单": 2}
+        # 获取副表警告信息并添加到主消息中（日期范围模式按整个范围另行提示）
+        if self.sub_table_warnings:
+            sub_table_warnings = self.sub_table_handler.get_warnings()
+            self.messages.extend(sub_table_warnings)
 
-        # 收集只有单量 > 0 的组
-        group_list = []
-        for (channel, otype, style), data in group_data.items():
-            if data['单量'] > 0:
-                group_list.append({
-                    "订单渠道": channel,
-                    "订单类型": otype,
-                    "款式": style,
-                    "单量": data['单量'],
-                    "实际数量": data['实际数量'],
-                    "订单渠道优先级": channel_priority.get(channel, 999),
-                    "订单类型优先级": order_type_priority.get(otype, 999),
-                    "款式排序": self.style_sort.get(style, max_sort + 1)
-                })
-
-        if group_list:
-            group_counts = pd.DataFrame(group_list)
-            # 按照订单渠道优先级、订单类型优先级和款式排序值升序排列
-            group_counts = group_counts.sort_values(["订单渠道优先级", "订单类型优先级", "款式排序"])
-            # 删除临时列
-            group_counts = group_counts.drop(columns=["订单渠道优先级", "订单类型优先级", "款式排序"])
-
-            for _, row in group_counts.iterrows():
-                result_data.append([
-                    row["订单渠道"],
-                    row["订单类型"],
-                    row["款式"],
-                    row["单量"],
-                    row["实际数量"],
-                    row["款式"] == "（未匹配到编码）",
-                    row["款式"] == "空值"
-                ])
+        # 只保留单量 > 0 的组
+        result_data = self.sort_result(GroupResult.from_totals(aggregator.totals, aggregator.first_touch))
 
         return {
             "data": result_data,
             "messages": self.messages
         }
 
-    def create_output_excel(self, result_data):
-        # 根据处理结果生成最终Excel文件：
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "汇总结果"
-        header_font = Font(color="FFFFFF", bold=True)
-        header_fill = PatternFill(start_color="9999FF", end_color="9999FF", fill_type="solid")
-        headers = ["订单渠道", "订单类型", "款式", "单量", "实际数量"]
-        ws.append(headers)
-
-        for col in range(1, len(headers) + 1):
-            cell = ws.cell(row=1, column=col)
-            cell.font = header_font
-            cell.fill = header_fill
-
-        result_df = pd.DataFrame(result_data, columns=[
-            "订单渠道", "订单类型", "款式", "单量", "实际数量",
-            "未匹配标记", "空值行标记"
-        ])
-
-        color_map = {
-            "green": Font(color="00AA00"),
-            "purple": Font(color="800080"),
-            "red": Font(color="FF0000")
-        }
-
-        ws.delete_rows(2, ws.max_row)
-
-        max_main_rows = len(result_df) if result_df is not None else 0
+    def sort_result(self, result_data):
+        """按订单渠道优先级、订单类型优先级和款式排序值升序排列，相同时保持首次出现顺序"""
+        max_sort = max(self.style_sort.values()) if self.style_sort else 999
 
-        for i in range(max_main_rows):
-            actual_row = i + 2
-            main_idx = i
-            main_row = [
-                result_df.iloc[main_idx]["订单渠道"],
-                result_df.iloc[main_idx]["订单类型"],
-                result_df.iloc[main_idx]["款式"],
-                result_df.iloc[main_idx]["单量"],
-                result_df.iloc[main_idx]["实际数量"]
-            ]
+        # 创建优先级映射（按字母顺序排序）
+        channel_priority = {"自营": 0, "分销": 1, "代发": 2}
+        # 订单类型优先级
+        order_type_priority = {"新订单": 0, "补发单": 1, "批采单": 2}
 
-            for col, val in enumerate(main_row, start=1):
-                ws.cell(row=actual_row, column=col, value=val)
-
-            if result_df.iloc[main_idx]["空值行标记"]:
-                for col in range(3, 6):
-                    ws.cell(row=actual_row, column=col).font = color_map["red"]
-            elif result_df.iloc[main_idx]["未匹配标记"] or result_df.iloc[main_idx]["款式"] == "（未匹配到部分编码）":
-                for col in range(3, 6):
-                    ws.cell(row=actual_row, column=col).font = color_map["red"]
-
-            cell_a = ws.cell(row=actual_row, column=1)
-            val_a = cell_a.value
-            if val_a in self.channel_colors:
-                cell_a.font = self.channel_colors[val_a]
-
-            cell_b = ws.cell(row=actual_row, column=2)
-            val_b = cell_b.value
-            if val_b in self.order_type_colors:
-                cell_b.font = self.order_type_colors[val_b]
-
-        ws.append([])
-
-        if self.messages:
-            for msg in self.messages:
-                if isinstance(msg, dict):
-                    ws.append([msg["text"]])
-                    last_row = ws.max_row
-                    cell = ws.cell(row=last_row, column=1)
-                    cell.font = color_map.get(msg["color"], Font())
-                else:
-                    ws.append([msg])
+        return result_data.sort_by(
+            [channel_priority.get(channel, 999) for channel in result_data.channels],
+            [order_type_priority.get(otype, 999) for otype in result_data.order_types],
+            [self.style_sort.get(style, max_sort + 1) for style in result_data.styles],
+        )
 
-        # 设置列宽
-        column_widths = {'A': 15, 'B': 15, 'C': 30, 'D': 10, 'E': 15}
-        for col, width in column_widths.items():
-            ws.column_dimensions[col].width = width
+    def output_colors(self):
+        """渠道 / 订单类型颜色，转换为写出后端使用的 {值: RGB字符串}"""
+        channel_colors = {value: font_rgb(font) for value, font in self.channel_colors.items()}
+        order_type_colors = {value: font_rgb(font) for value, font in self.order_type_colors.items()}
+        return ({value: rgb for value, rgb in channel_colors.items() if rgb},
+                {value: rgb for value, rgb in order_type_colors.items() if rgb})
 
-        output_path = os.path.join(self.desktop_path, "输出结果.xlsx")
-        wb.save(output_path)
-        return output_path
+    def create_output_excel(self, result_data):
+        # 根据处理结果（GroupResult）生成最终Excel文件，由配置的写出后端完成
+        writer = get_writer(self.writer_backend)
+        channel_colors, order_type_colors = self.output_colors()
+        return writer.write(self.output_path, result_data.rows(), self.messages, channel_colors, order_type_colors)
+
+    def create_output_workbook(self, sheets):
+        """
+        写出多个 sheet 的输出文件（日期范围模式）
+
+        :param sheets: [(sheet名称, 结果 GroupResult, 提示消息列表), ...]
+        """
+        writer = get_writer(self.writer_backend)
+        channel_colors, order_type_colors = self.output_colors()
+        return writer.write_sheets(
+            self.output_path,
+            [(title, result_data.rows(), messages) for title, result_data, messages in sheets],
+            channel_colors,
+            order_type_colors,
+        )
+
+    def export_results(self, result_data):
+        """
+        按 (渠道, 类型, 款式, 波次) 追加到列式存储（function_group_export）
+
+        失败时不影响输出结果.xlsx，错误信息写入提示消息和计时报告，并返回给调用方。
+
+        :return: (写入的文件路径, 错误信息)，成功时错误信息为None
+        """
+        now = datetime.now()
+        run = {
+            "run_id": new_run_id(now),
+            "run_date": now.strftime("%Y-%m-%d"),
+            "created_at": now.isoformat(timespec="seconds"),
+            "order_file": os.path.abspath(self.order_path),
+        }
+        try:
+            rows = export_rows(self.wave_totals, set(zip(result_data.channels, result_data.order_types,
+                                                         result_data.styles)))
+            path = export_results(self.export_format, self.export_dir, run, rows)
+        except Exception as e:
+            error = f"导出汇总数据失败: {str(e)}"
+            self.profile.count("export", {"format": self.export_format, "run_id": run["run_id"], "error": error})
+            self.messages.append({"text": f"注意：{error}", "color": self.COLOR_WARN})
+            return None, error
+        self.profile.count("export", {"format": self.export_format, "run_id": run["run_id"], "rows": len(rows)})
+        self.messages.append({"text": f"已导出 {len(rows)} 行汇总数据（{run['run_id']}）: {path}",
+                              "color": self.COLOR_INFO})
+        return path, None
+
+    def with_export_error(self, message):
+        """导出列式存储失败时在完成信息后附上错误信息"""
+        if self.export_error:
+            return f"{message}；{self.export_error}"
+        return message
 
     def open_file_windows(self, file_path):
         try:
@@ -582,31 +740,147 @@ class ExcelContrastProcessor:
 
     def process(self):
         start_time = time.time()
+        profile_started = self.profile.start()
 
         try:
-            df1, df_code, error = self.load_data()
+            self.report_progress("load")
+            with self.profile.stage("load"):
+                error = self.load_reference_data()
             if error:
                 return False, error
 
-            self.build_code_mappings(df_code)
+            success, message = self.calculate(start_time)
+            if success:
+                self.open_file_windows(self.output_path)
+                message = self.with_export_error("处理完成，已自动打开输出文件")
+            return success, message
+
+        except CalculationCancelled:
+            return False, "分组计算已取消"
+        except Exception as e:
+            return False, f"处理过程中出错: {str(e)}"
+        finally:
+            if profile_started:
+                self.finish_profile()
+
+    def calculate(self, start_time=None):
+        """
+        参考数据已加载后，读取订单、汇总并写出输出文件（不打开文件）
 
-            result = self.process_data(df1)
+        :param start_time: 计时起点，默认为调用时刻
+        :return: (是否成功, 信息)
+        """
+        if start_time is None:
+            start_time = time.time()
+        profile_started = self.profile.start()
+
+        try:
+            result, error = self.process_stream(self.order_reader())
+            if error:
+                return False, error
             result_data = result["data"]
 
+            if self.wave_totals is not None:
+                self.report_progress("export")
+                with self.profile.stage("export", rows=len(self.wave_totals)):
+                    _, self.export_error = self.export_results(result_data)
+
             elapsed_time = time.time() - start_time
+            self.elapsed_time = elapsed_time
             self.messages.insert(0, {
                 "text": f"计算用时：{elapsed_time:.2f} 秒",
                 "color": self.COLOR_INFO
             })
+            self.messages[1:1] = self.profile_messages()
 
-            output_path = self.create_output_excel(result_data)
-            self.open_file_windows(output_path)
+            self.report_progress("write")
+            with self.profile.stage("write", rows=len(result_data)):
+                output_path = self.create_output_excel(result_data)
+            self.output_written = True
+            return True, self.with_export_error(f"处理完成: {output_path}")
 
-            return True, "处理完成，已自动打开输出文件"
+        except CalculationCancelled:
+            return False, "分组计算已取消"
+        except Exception as e:
+            return False, f"处理过程中出错: {str(e)}"
+        finally:
+            if profile_started:
+                self.finish_profile()
+
+    def calculate_range(self, order_paths, start, end, jobs=1, start_time=None):
+        """
+        参考数据已加载后，按日期范围汇总多个订单文件并写出输出文件（不打开文件）
+
+        第一个 sheet「汇总」为整个日期范围的合计，其后每天一个 sheet，详见 function_group_range。
+        日期范围模式只有命令行入口（function_group_cli），界面不调用。
+
+        :param order_paths: 订单文件、目录或通配符列表，按 expand_inputs 展开
+        :param start: 开始日期（date 或 'YYYY-MM-DD'），含当天
+        :param end: 结束日期，含当天
+        :param jobs: 并行读取的文件数
+        :return: (是否成功, 信息)
+        """
+        if start_time is None:
+            start_time = time.time()
+        profile_started = self.profile.start()
+
+        try:
+            order_paths = expand_inputs(order_paths)
+            if not order_paths:
+                return False, "没有需要处理的文件"
+            try:
+                days = range_days(start, end)
+            except ValueError as e:
+                return False, str(e)
+
+            context = self.shared_context()
+            # 日期范围模式不导出列式存储，不需要按波次汇总
+            context["wave_breakdown"] = False
+            done = []
+
+            def on_file(file_days):
+                done.append(file_days)
+                self.report_progress("map", sum(partial.rows for item in done for partial in item.days.values()))
+
+            self.report_progress("map", 0)
+            with self.profile.stage("map"):
+                files = load_files(context, order_paths, days, jobs, on_file)
+            failed = [file_days for file_days in files if file_days.error]
+            if len(failed) == len(files):
+                return False, "；".join(f"{file_days.name}：{file_days.error}" for file_days in failed)
+
+            self.report_progress("aggregate")
+            with self.profile.stage("aggregate"):
+                sheets, messages = combine_files(self, files)
+
+            elapsed_time = time.time() - start_time
+            self.elapsed_time = elapsed_time
+            messages[0:0] = [
+                {"text": f"计算用时：{elapsed_time:.2f} 秒", "color": self.COLOR_INFO},
+                {"text": f"日期范围：{day_title(days[0])} 至 {day_title(days[-1])}，共 {len(files)} 个文件，失败 {len(failed)} 个",
+                 "color": self.COLOR_ERROR if failed else self.COLOR_INFO},
+            ]
+            self.messages = messages
+            self.profile.count("range", {
+                "days": len(days),
+                "files": len(files),
+                "failed": len(failed),
+                "file_seconds": {file_days.name: round(file_days.elapsed, 3) for file_days in files},
+            })
 
+            self.report_progress("write")
+            with self.profile.stage("write", rows=sum(len(result_data) for _, result_data, _ in sheets)):
+                output_path = self.create_output_workbook(sheets)
+            self.output_written = True
+            return True, f"处理完成: {output_path}"
 
+        except CalculationCancelled:
+            return False, "分组计算已取消"
         except Exception as e:
             return False, f"处理过程中出错: {str(e)}"
+        finally:
+            if profile_started:
+                self.finish_profile()
 
 
 def group_calculation():
@@ -0,0 +1,159 @@
+# function_group_cli.py
+"""
+分组计算命令行入口
+
+不经过界面、不自动打开文件，可由计划任务调用，一次处理多个导出文件：
+    python function_group_cli.py D:/导出/*.xlsx -r 编码对应关系.xlsx -s 副表.xlsx -o D:/结果 -j 4
+
+编码对应关系和副表只读取一次，各文件共用；-j 大于1时多个文件在进程池中并行计算。
+未指定 -o 时输出到各输入文件所在目录，文件名为「输入文件名_输出结果.xlsx」；
+只有一个输入文件且 -o 以 .xlsx 结尾时直接作为输出文件路径。
+
+指定 --from / --to 时为日期范围模式，全部输入文件按天汇总到一个多 sheet 的输出文件：
+    python function_group_cli.py D:/导出 --from 2024-05-01 --to 2024-05-07 -o D:/结果 -j 4
+-o 为目录或未指定时，输出文件名为「输出结果_开始日期-结束日期.xlsx」。日期范围模式只有命令行入口，界面不提供。
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import freeze_support
+
+from function_group_calculation import ExcelContrastProcessor
+from function_group_parallel import init_worker, worker_context
+from function_group_range import expand_inputs, range_output_name
+
+
+def calculate_file(context, order_path, output_path, incremental=True, workers=None):
+    """
+    用已加载的参考数据计算单个文件
+
+    :return: (输入文件, 是否成功, 信息, 用时秒数)
+    """
+    start_time = time.time()
+    processor = ExcelContrastProcessor.from_context(context, order_path, output_path)
+    processor.incremental = incremental
+    if workers is not None:
+        processor.workers = workers
+    success, message = processor.calculate(start_time)
+    return order_path, success, message, time.time() - start_time
+
+
+def _calculate_in_worker(order_path, output_path, incremental):
+    # 文件之间已并行，单个文件内不再启动进程池
+    return calculate_file(worker_context(), order_path, output_path, incremental, workers=1)
+
+
+def output_path_for(order_path, output):
+    """输入文件对应的输出路径"""
+    if output and output.lower().endswith(".xlsx"):
+        return output
+    stem = os.path.splitext(os.path.basename(order_path))[0]
+    directory = output or os.path.dirname(os.path.abspath(order_path))
+    return os.path.join(directory, f"{stem}_输出结果.xlsx")
+
+
+def run_batch(order_paths, reference_path=None, sub_table_path=None, output=None, jobs=1, incremental=True,
+              report=print):
+    """
+    批量计算
+
+    :param jobs: 并行计算的文件数
+    :param report: 每个文件完成时调用，参数为一行说明文字
+    :return: [(输入文件, 是否成功, 信息, 用时秒数), ...]，顺序与 order_paths 一致；参考数据读取失败时返回错误信息
+    """
+    if len(order_paths) > 1 and output and output.lower().endswith(".xlsx"):
+        return "处理多个文件时输出路径应为目录"
+    if output and not output.lower().endswith(".xlsx"):
+        os.makedirs(output, exist_ok=True)
+
+    loader = ExcelContrastProcessor(reference_path=reference_path, sub_table_path=sub_table_path)
+    error = loader.load_reference_data()
+    if error:
+        return error
+    context = loader.shared_context()
+
+    tasks = [(path, output_path_for(path, output)) for path in order_paths]
+    results = []
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)), initializer=init_worker,
+                                 initargs=(context,)) as executor:
+            futures = [executor.submit(_calculate_in_worker, path, output_path, incremental)
+                       for path, output_path in tasks]
+            for future in futures:
+                results.append(future.result())
+                report(format_result(results[-1]))
+    else:
+        for path, output_path in tasks:
+            results.append(calculate_file(context, path, output_path, incremental))
+            report(format_result(results[-1]))
+    return results
+
+
+def run_range(order_paths, start, end, reference_path=None, sub_table_path=None, output=None, jobs=1):
+    """
+    日期范围模式：全部文件按天汇总到一个输出文件
+
+    :return: (是否成功, 信息)
+    """
+    if output and output.lower().endswith(".xlsx"):
+        output_path = output
+    else:
+        directory = output or os.path.dirname(os.path.abspath(order_paths[0]))
+        os.makedirs(directory, exist_ok=True)
+        output_path = os.path.join(directory, range_output_name(start, end))
+
+    processor = ExcelContrastProcessor(reference_path=reference_path, sub_table_path=sub_table_path,
+                                       output_path=output_path)
+    error = processor.load_reference_data()
+    if error:
+        return False, error
+    return processor.calculate_range(order_paths, start, end, jobs)
+
+
+def format_result(result):
+    order_path, success, message, elapsed = result
+    status = "完成" if success else "失败"
+    return f"[{status}] {os.path.basename(order_path)}  用时 {elapsed:.2f} 秒  {message}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分组计算（命令行 / 批量模式）")
+    parser.add_argument("inputs", nargs="+", help="订单导出文件（xlsx / csv / parquet / arrow）、目录或通配符")
+    parser.add_argument("-r", "--reference", help="编码对应关系.xlsx，默认使用桌面上的文件")
+    parser.add_argument("-s", "--sub-table", help="副表.xlsx，默认使用桌面上的文件")
+    parser.add_argument("-o", "--output", help="输出目录；只有一个输入文件时也可以是 .xlsx 文件路径")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="并行计算的文件数，默认 1")
+    parser.add_argument("--no-incremental", action="store_true", help="不复用上次保存的波次结果，全部重新计算")
+    parser.add_argument("--from", dest="start", help="日期范围模式的开始日期，如 2024-05-01")
+    parser.add_argument("--to", dest="end", help="日期范围模式的结束日期（含），默认与开始日期相同")
+    args = parser.parse_args(argv)
+
+    order_paths = expand_inputs(args.inputs)
+    if not order_paths:
+        print("没有找到需要处理的文件")
+        return 1
+
+    start_time = time.time()
+    if args.start or args.end:
+        success, message = run_range(order_paths, args.start or args.end, args.end or args.start, args.reference,
+                                     args.sub_table, args.output, jobs=max(1, args.jobs))
+        print(message)
+        print(f"共 {len(order_paths)} 个文件，总用时 {time.time() - start_time:.2f} 秒")
+        return 0 if success else 1
+
+    results = run_batch(order_paths, args.reference, args.sub_table, args.output,
+                        jobs=max(1, args.jobs), incremental=not args.no_incremental)
+    if isinstance(results, str):
+        print(results)
+        return 1
+
+    failed = sum(1 for _, success, _, _ in results if not success)
+    print(f"共 {len(results)} 个文件，失败 {failed} 个，总用时 {time.time() - start_time:.2f} 秒")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    freeze_support()
+    sys.exit(main())
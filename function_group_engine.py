@@ -0,0 +1,832 @@
+# function_group_engine.py
+"""
+分组计算列式引擎
+
+把「映射 → 拆分编码 → 编码字典查找 → 按(渠道, 类型, 款式)汇总」改为整列运算：
+店铺、订单类型、波次、货品商家编码先按列去重编号，再折叠为不同的 (波次, 店铺, 类型, 编码) 组合并记录行数，
+映射、解析、汇总只按组合做一次，结果乘以组合的行数。
+主编码的轮询选择按候选组成批分配，结果与逐行调用 UniformSelector 完全一致。
+"""
+from collections import OrderedDict, defaultdict
+from functools import partial
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+from function_group_sub_table import WAVE_NORMAL, WAVE_EXCLUDED, WAVE_BRUSH, WAVE_NON_TODAY
+
+# 首次出现位置编码：行位置 * TOUCH_SCALE + 行内序号，用于还原逐行处理时的分组顺序
+TOUCH_SCALE = 1024
+
+# 提示消息中列出的行数：未匹配的映射组合每组 10 行，未匹配 / 部分未匹配编码共 20 行
+MAPPING_SAMPLE_SIZE = 10
+ROW_SAMPLE_SIZE = 20
+
+
+class RowSample:
+    """
+    有界的问题行记录：总行数 count，另按行号升序保留最小的前 limit 行及其明细
+
+    add_many() / merge() 的先后顺序不影响结果，与保留全部行再排序取前 limit 行相同，
+    内存只与 limit 有关，与问题行的多少无关。
+    """
+    __slots__ = ("limit", "count", "rows", "details")
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.count = 0
+        self.rows = []
+        self.details = []
+
+    def __getstate__(self):
+        return self.limit, self.count, self.rows, self.details
+
+    def __setstate__(self, state):
+        self.limit, self.count, self.rows, self.details = state
+
+    def add(self, row, detail=None):
+        self.add_many([row], 1, [detail])
+
+    def add_many(self, rows, count, details=None):
+        """
+        :param rows: 这批问题行中行号最小的若干行（至多 limit 个，升序）
+        :param count: 这批问题行的总行数
+        :param details: 与 rows 对应的明细，为None时不记录明细
+        """
+        self.count += count
+        if not rows:
+            return
+        if len(self.rows) >= self.limit and rows[0] >= self.rows[-1]:
+            return
+        if details is None:
+            details = [None] * len(rows)
+        kept = sorted(zip(self.rows + list(rows), self.details + list(details)), key=itemgetter(0))[:self.limit]
+        self.rows = [row for row, _ in kept]
+        self.details = [detail for _, detail in kept]
+
+    def merge(self, other):
+        self.add_many(other.rows, other.count, other.details)
+
+    def items(self):
+        """按行号升序产出 (行号, 明细)"""
+        return zip(self.rows, self.details)
+
+
+def row_samples(limit):
+    """键 -> RowSample 的字典，新键自动创建（可序列化，随汇总器保存）"""
+    return defaultdict(partial(RowSample, limit))
+
+
+def combine_samples(samples, limit=ROW_SAMPLE_SIZE):
+    """合并多个 RowSample（如各波次的记录）"""
+    combined = RowSample(limit)
+    for sample in samples:
+        combined.merge(sample)
+    return combined
+
+
+def grouped_rows(group_keys, rows, limit):
+    """
+    按整数键分组的行号
+
+    :return: 逐组产出 (键, 行数, 行号最小的前 limit 行（升序列表）)
+    """
+    order = np.lexsort((rows, group_keys))
+    keys = group_keys[order]
+    rows = rows[order]
+    bounds = np.flatnonzero(np.diff(keys)) + 1
+    starts = np.concatenate(([0], bounds)).tolist()
+    ends = np.concatenate((bounds, [len(keys)])).tolist()
+    for start, end in zip(starts, ends):
+        yield int(keys[start]), end - start, rows[start:min(end, start + limit)].tolist()
+
+
+class ParsedCode:
+    """单个货品商家编码字符串的解析结果"""
+    __slots__ = ("codes", "quantities", "valid_codes", "unmatched_codes",
+                 "candidates", "group_key", "same_quantity", "max_qty_codes")
+
+    def __init__(self, product_code, processor):
+        self.codes, self.quantities = processor.parse_codes_and_quantities(product_code)
+        code_dict = processor.code_dict
+        priority_dict = processor.priority_dict
+        self.valid_codes = [code for code in self.codes if code in code_dict]
+        self.unmatched_codes = [code for code in self.codes if code not in code_dict]
+        self.candidates = []
+        self.group_key = ()
+        self.same_quantity = True
+        self.max_qty_codes = []
+
+        if self.valid_codes:
+            min_pri = min(priority_dict[c] for c in self.valid_codes)
+            self.candidates = [c for c in self.valid_codes if priority_dict[c] == min_pri]
+            self.group_key = tuple(sorted(self.candidates))
+            self.same_quantity = len({self.quantities[c] for c in self.candidates}) == 1
+            max_qty = max(self.quantities[c] for c in self.candidates)
+            self.max_qty_codes = [c for c in self.candidates if self.quantities[c] == max_qty]
+
+
+class ParsedCodeCache:
+    """
+    货品商家编码解析缓存（LRU，条目数有上限）
+
+    以原始编码字符串为键缓存 ParsedCode。条目依赖编码字典和优先级字典，
+    两者变化时需调用 bind() 清空。
+    hits 为直接复用解析结果的行数，misses 为实际解析的次数。
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._bound = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def bind(self, code_dict, priority_dict):
+        """绑定当前编码字典，与上次绑定的内容不同则清空缓存"""
+        if self._bound != (code_dict, priority_dict):
+            self._entries.clear()
+            self._bound = (dict(code_dict), dict(priority_dict))
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, product_code, processor, count=1):
+        """
+        取得解析结果，未命中时解析并写入缓存
+
+        :param count: 使用该编码的行数，用于统计命中
+        """
+        entry = self._entries.get(product_code)
+        if entry is not None:
+            self._entries.move_to_end(product_code)
+            self.hits += count
+            return entry
+
+        entry = ParsedCode(product_code, processor)
+        self.misses += 1
+        self.hits += count - 1
+        self._entries[product_code] = entry
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+
+class UniformSelector:
+    """
+    在同一候选组合下实现「公平、均匀」的款式选择，避免总是选同一个编码
+
+    候选组合（排序后的候选编码元组）驻留为整数组编号，
+    各组的轮询序号保存在按组编号索引的整数数组中。
+    select() 逐行选择；select_many() 为同一组的多行一次性分配，结果与逐行调用相同。
+    """
+
+    def __init__(self):
+        # 候选组合 -> 组编号
+        self.group_ids = {}
+        # 组编号 -> 候选编码数组（即排序后的候选组合）
+        self.group_codes = []
+        # 组编号 -> 最大数量编码在候选中的位置，在该组首次出现数量不同的行时确定
+        self.max_qty_picks = []
+        # 组编号 -> 同数量时的轮询序号 / 最大数量编码之间的轮询序号
+        self.index = np.zeros(0, dtype=np.int64)
+        self.max_qty_index = np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _reserve(array, size):
+        """容量不足时按倍数扩充整数数组"""
+        if size <= len(array):
+            return array
+        grown = np.zeros(max(size, len(array) * 2, 64), dtype=np.int64)
+        grown[:len(array)] = array
+        return grown
+
+    def intern(self, group_key):
+        """返回候选组合的组编号，首次出现时分配"""
+        group_id = self.group_ids.get(group_key)
+        if group_id is not None:
+            return group_id
+
+        group_id = len(self.group_codes)
+        self.group_ids[group_key] = group_id
+        self.group_codes.append(np.array(group_key, dtype=object))
+        self.max_qty_picks.append(None)
+
+        self.index = self._reserve(self.index, group_id + 1)
+        self.max_qty_index = self._reserve(self.max_qty_index, group_id + 1)
+        return group_id
+
+    def select_many(self, group_id, count, same_quantity=True, max_qty_codes=None):
+        """
+        为同一候选组的 count 行按顺序分配主编码
+
+        :param same_quantity: 候选编码数量是否相同，相同时在全部候选之间轮询
+        :param max_qty_codes: 数量不同时的最大数量编码，只在该组第一次使用时记录
+        :return: 选中的编码数组
+        """
+        return self.group_codes[group_id][self.pick_many(group_id, count, same_quantity, max_qty_codes)]
+
+    def pick_many(self, group_id, count, same_quantity=True, max_qty_codes=None):
+        """与 select_many 相同，返回选中编码在 group_codes[group_id] 中的位置"""
+        codes = self.group_codes[group_id]
+        steps = np.arange(count, dtype=np.int64)
+        if same_quantity:
+            picks = (self.index[group_id] + steps) % len(codes)
+            self.index[group_id] += count
+        else:
+            positions = self.max_qty_picks[group_id]
+            if positions is None:
+                group_key = list(codes)
+                positions = np.array([group_key.index(code) for code in max_qty_codes], dtype=np.int64)
+                self.max_qty_picks[group_id] = positions
+            if len(positions) > 1:
+                picks = positions[(self.max_qty_index[group_id] + steps) % len(positions)]
+                self.max_qty_index[group_id] += count
+            else:
+                picks = np.repeat(positions[0], count)
+        return picks
+
+    def select(self, candidates, quantities, priority_dict, group_key):
+        """逐行选择：candidates 中优先级最高的编码参与选择，group_key 为这些编码排序后的元组"""
+        if not candidates:
+            return None
+
+        min_priority = min(priority_dict[code] for code in candidates)
+        candidates = [code for code in candidates if priority_dict[code] == min_priority]
+        same_quantity = len({quantities[code] for code in candidates}) == 1
+        max_qty = max(quantities[code] for code in candidates)
+        max_qty_codes = [code for code in candidates if quantities[code] == max_qty]
+        return self.select_many(self.intern(group_key), 1, same_quantity, max_qty_codes)[0]
+
+
+def factorize_column(column, strip=True):
+    """
+    按字符串值（默认去除首尾空格）对一列去重编号
+
+    分类列只对各分类做一次字符串转换，再按分类编码回填到每行；其它列逐行转换。
+    两种情况的结果相同，不同值按首次出现的顺序排列。
+
+    :return: (每行编号, 不同值数组)
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy()
+        if len(codes) and codes.min() >= 0:
+            values = column.cat.categories.astype(str)
+            if strip:
+                values = values.str.strip()
+            category_ids, uniques = pd.factorize(values)
+            # 去掉未出现的分类，并按首次出现重新编号
+            ids, used = pd.factorize(category_ids[codes])
+            return ids, uniques[used]
+        column = column.astype(object)
+
+    values = column.astype(str)
+    if strip:
+        values = values.str.strip()
+    return pd.factorize(values)
+
+
+def factorize_waves(wave_column):
+    """
+    波次去重编号
+
+    :return: (每行的波次编号, 波次列表)，空波次的编号为 -1
+    """
+    wave_ids, waves = factorize_column(wave_column)
+    empty = np.asarray(waves == "", dtype=bool)
+    wave_empty = empty[wave_ids] if len(waves) else np.zeros(len(wave_ids), dtype=bool)
+    wave_empty |= wave_column.isna().to_numpy()
+    return np.where(wave_empty, -1, wave_ids), list(waves)
+
+
+def split_pairs_by_wave(pair_ids, pair_output, wave_ids, waves):
+    """
+    把映射组合按波次拆开：(映射组合, 波次) 重新编号，输出组合变为 (输出渠道, 输出类型, 波次)，空波次为None
+
+    :return: (每个组合的新编号, 新输出组合列表)
+    """
+    width = len(waves) + 1
+    split_ids, uniques = pd.factorize(pair_ids.astype(np.int64) * width + wave_ids + 1)
+    split_output = []
+    for code in uniques.tolist():
+        output = pair_output[code // width]
+        wave_id = code % width - 1
+        split_output.append(None if output is None else (output[0], output[1], waves[wave_id] if wave_id >= 0 else None))
+    return split_ids, split_output
+
+
+class OrderTuples:
+    """
+    数据块按 (打印波次, 店铺, 订单类型, 货品商家编码) 去重后的组合
+
+    各组合记录行数（counts）和首行位置（first_positions），映射、解析、汇总只按组合计算一次；
+    row_tuples 为每行所属的组合，用于需要行号或行顺序的步骤（未匹配明细、主编码轮询）。
+    """
+    __slots__ = ("positions", "row_tuples", "counts", "first_positions",
+                 "wave_ids", "shop_ids", "type_ids", "code_ids", "waves", "shops", "order_types", "codes")
+
+    def __len__(self):
+        return len(self.counts)
+
+    def group_by(self, keys, mask):
+        """
+        按组合上的整数键合并 mask 选中的组合
+
+        :return: (键数组, 行数数组, 首行位置数组)，键升序
+        """
+        keys = keys[mask]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        counts = np.zeros(len(unique_keys), dtype=np.int64)
+        np.add.at(counts, inverse, self.counts[mask])
+        first = np.full(len(unique_keys), np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(first, inverse, self.first_positions[mask])
+        return unique_keys, counts, first
+
+
+def collapse_rows(df):
+    """
+    把数据块折叠为不同的 (波次, 店铺, 订单类型, 编码) 组合
+
+    各列的取值规则与逐列处理相同：波次、店铺、订单类型去除首尾空格，空波次编号为 -1，编码保持原样。
+    """
+    wave_ids, waves = factorize_waves(df['打印波次'])
+    shop_ids, shops = factorize_column(df['店铺'])
+    type_ids, order_types = factorize_column(df['订单类型'])
+    code_ids, codes = factorize_column(df['货品商家编码'], strip=False)
+
+    key = wave_ids.astype(np.int64) + 1
+    key_size = len(waves) + 1
+    for ids, size in ((shop_ids, len(shops)), (type_ids, len(order_types)), (code_ids, len(codes))):
+        # 组合键可能超出 int64 时先压缩为连续编号
+        if key_size * size >= 1 << 62:
+            key, used = pd.factorize(key)
+            key_size = len(used)
+        key = key * size + ids
+        key_size *= size
+    unique_keys, first_rows, row_tuples, counts = np.unique(
+        key, return_index=True, return_inverse=True, return_counts=True)
+
+    positions = df.index.to_numpy(dtype=np.int64)
+    tuples = OrderTuples()
+    tuples.positions = positions
+    tuples.row_tuples = row_tuples.reshape(-1)
+    tuples.counts = counts.astype(np.int64)
+    # 行位置在块内不一定递增（合并后的数据），首行位置取最小值
+    first_positions = np.full(len(unique_keys), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first_positions, tuples.row_tuples, positions)
+    tuples.first_positions = first_positions
+    tuples.wave_ids = wave_ids[first_rows]
+    tuples.shop_ids = shop_ids[first_rows]
+    tuples.type_ids = type_ids[first_rows]
+    tuples.code_ids = code_ids[first_rows]
+    tuples.waves = waves
+    tuples.shops = shops
+    tuples.order_types = order_types
+    tuples.codes = codes
+    return tuples
+
+
+class GroupResult:
+    """
+    分组汇总结果（按列保存）
+
+    由汇总器的 totals 直接生成，按整数排序键排序后交给写出后端，
+    中间不再构造 DataFrame 或逐行字典。
+    """
+    __slots__ = ("channels", "order_types", "styles", "orders", "quantities")
+
+    UNMATCHED_STYLE = "（未匹配到编码）"
+    EMPTY_STYLE = "空值"
+
+    def __init__(self, channels=(), order_types=(), styles=(), orders=(), quantities=()):
+        self.channels = list(channels)
+        self.order_types = list(order_types)
+        self.styles = list(styles)
+        self.orders = np.asarray(orders, dtype=np.int64)
+        self.quantities = np.asarray(quantities, dtype=np.int64)
+
+    @classmethod
+    def from_totals(cls, totals, first_touch):
+        """取单量大于0的组，按首次出现顺序排列"""
+        keys = sorted((key for key, (orders, _) in totals.items() if orders > 0), key=first_touch.__getitem__)
+        return cls(
+            (key[0] for key in keys),
+            (key[1] for key in keys),
+            (key[2] for key in keys),
+            [totals[key][0] for key in keys],
+            [totals[key][1] for key in keys],
+        )
+
+    def __len__(self):
+        return len(self.styles)
+
+    def take(self, order):
+        """按给定的行顺序返回新结果"""
+        return GroupResult(
+            (self.channels[i] for i in order),
+            (self.order_types[i] for i in order),
+            (self.styles[i] for i in order),
+            self.orders[order],
+            self.quantities[order],
+        )
+
+    def sort_by(self, *key_columns):
+        """按整数键列稳定排序，第一列为主键"""
+        if not len(self):
+            return self
+        order = np.lexsort([np.asarray(column, dtype=np.int64) for column in reversed(key_columns)])
+        return self.take(order)
+
+    def rows(self):
+        """逐行产出 (订单渠道, 订单类型, 款式, 单量, 实际数量, 未匹配标记, 空值行标记)"""
+        for channel, order_type, style, orders, quantity in zip(
+                self.channels, self.order_types, self.styles, self.orders.tolist(), self.quantities.tolist()):
+            yield (channel, order_type, style, orders, quantity,
+                   style == self.UNMATCHED_STYLE, style == self.EMPTY_STYLE)
+
+
+class GroupAggregator:
+    """
+    分组汇总器
+
+    可多次调用 feed() 依次送入数据块（行索引需为原表中的行位置），选择器状态和统计结果在各块之间延续。
+    defer_selection=True 时主编码暂不分配，待 merge() 合并多个汇总器后统一调用 resolve_selection()，
+    按行位置顺序分配，结果与一次性处理全部数据相同。
+    classify_waves=False 时不按副表区分排除 / 刷单波次，全部按普通波次汇总，
+    同时在 mapped_pairs 中记录各映射组合的行数，供之后按波次分类重新组合。
+    处理器的 wave_breakdown 为True时另在 wave_totals 中按 (渠道, 类型, 款式, 波次) 汇总（导出列式存储用），
+    此时映射组合按波次拆开，输出组合为 (输出渠道, 输出类型, 波次)，totals 的结果不变。
+    """
+
+    def __init__(self, processor, selector=None, defer_selection=False, classify_waves=True):
+        self.processor = processor
+        self.selector = selector if selector is not None else UniformSelector()
+        self.defer_selection = defer_selection
+        self.classify_waves = classify_waves
+
+        # (渠道, 类型, 款式) -> [单量, 实际数量]
+        self.totals = {}
+        # (渠道, 类型, 款式) -> 首次出现位置，输出时按此还原分组顺序
+        self.first_touch = {}
+        # 尚未分配主编码的行：[(行位置, 映射组合编号, 映射结果列表, 编码编号, 解析结果列表), ...]
+        self._pending = []
+
+        # 未匹配的映射关系（"渠道|类型" -> RowSample）/ 未匹配与部分未匹配编码（波次 -> RowSample，明细为未匹配的编码），
+        # 只保留行数和行号最小的若干行
+        self.unmatched_mappings = row_samples(MAPPING_SAMPLE_SIZE)
+        self.unmatched_waves = row_samples(ROW_SAMPLE_SIZE)
+        self.partial_unmatched_waves = row_samples(ROW_SAMPLE_SIZE)
+        self.has_unmatched_codes = False
+        self.brush_wave_rows = defaultdict(int)
+        self.excluded_row_count = 0
+        self.unmapped_row_count = 0
+        self.processed_excluded_waves = set()
+        self.processed_brush_waves = set()
+        # (输出渠道, 输出类型) -> [已映射行数, 首行位置]，仅 classify_waves=False 时记录
+        self.mapped_pairs = {}
+        # (渠道, 类型, 款式, 波次) -> [单量, 实际数量]，不按波次汇总时为None
+        self.wave_totals = {} if getattr(processor, "wave_breakdown", False) else None
+
+    def __getstate__(self):
+        # 处理器和选择器不随汇总结果保存
+        state = self.__dict__.copy()
+        state["processor"] = None
+        state["selector"] = None
+        return state
+
+    def _add(self, key, orders, quantity, touch):
+        totals = self.totals.get(key)
+        if totals is None:
+            self.totals[key] = [orders, quantity]
+            self.first_touch[key] = touch
+            return
+        totals[0] += orders
+        totals[1] += quantity
+        if touch < self.first_touch[key]:
+            self.first_touch[key] = touch
+
+    def _add_quantities(self, pair_ids, code_ids, counts, first_positions, pair_output, parsed):
+        """
+        实际数量：每个(映射组合, 编码串)按编码串中的各有效编码展开，行数乘以编码数量，
+        首次出现位置为 首行位置 * TOUCH_SCALE + 编码序号，再按(输出渠道, 输出类型, 款式)合并后累加
+        """
+        code_dict = self.processor.code_dict
+        style_ids = {}
+        entry_styles = []
+        entry_quantities = []
+        entry_steps = []
+        for entry in parsed:
+            entry_styles.extend(style_ids.setdefault(code_dict[code], len(style_ids)) for code in entry.valid_codes)
+            entry_quantities.extend(entry.quantities[code] for code in entry.valid_codes)
+            entry_steps.extend(min(j, TOUCH_SCALE - 1) for j in range(len(entry.valid_codes)))
+        entry_sizes = np.array([len(entry.valid_codes) for entry in parsed], dtype=np.int64)
+        entry_offsets = np.concatenate(([0], np.cumsum(entry_sizes)[:-1]))
+        styles = list(style_ids)
+
+        output_ids, outputs = pd.factorize(pd.Series(
+            [pair_output[pair] if pair_output[pair] is not None else ("", "") for pair in range(len(pair_output))],
+            dtype=object))
+
+        # 每个组合重复其编码个数次，within 为组合内的编码序号
+        sizes = entry_sizes[code_ids]
+        combo_index = np.repeat(np.arange(len(code_ids)), sizes)
+        within = np.arange(len(combo_index)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        flat = entry_offsets[code_ids][combo_index] + within
+
+        keys = output_ids[pair_ids][combo_index].astype(np.int64) * len(styles) + np.asarray(entry_styles, dtype=np.int64)[flat]
+        quantities = counts[combo_index] * np.asarray(entry_quantities, dtype=np.int64)[flat]
+        touches = first_positions[combo_index] * TOUCH_SCALE + np.asarray(entry_steps, dtype=np.int64)[flat]
+
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        totals = np.zeros(len(unique_keys), dtype=np.int64)
+        np.add.at(totals, inverse, quantities)
+        first = np.full(len(unique_keys), np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(first, inverse, touches)
+        for key, quantity, touch in zip(unique_keys.tolist(), totals.tolist(), first.tolist()):
+            self._add_output(outputs[key // len(styles)], styles[key % len(styles)], 0, quantity, touch)
+
+    def _add_output(self, output, style, orders, quantity, touch):
+        """按输出组合累加；输出组合带波次时同时计入 wave_totals"""
+        self._add((output[0], output[1], style), orders, quantity, touch)
+        if len(output) > 2:
+            key = (output[0], output[1], style, output[2])
+            totals = self.wave_totals.get(key)
+            if totals is None:
+                self.wave_totals[key] = [orders, quantity]
+            else:
+                totals[0] += orders
+                totals[1] += quantity
+
+    def _add_brush(self, output, count, first_position):
+        self._add_output(output, self.processor.brush_style, count, count, first_position * TOUCH_SCALE)
+
+    def merge(self, other, classification="normal", wave=None):
+        """
+        合并另一个汇总器的结果
+
+        :param classification: 对 classify_waves=False 汇总的单个波次，按 normal / excluded / brush 合并
+        :param wave: classification 不为 normal 时对应的波次
+        """
+        for key, sample in other.unmatched_mappings.items():
+            self.unmatched_mappings[key].merge(sample)
+        self.unmapped_row_count += other.unmapped_row_count
+
+        if classification == "excluded":
+            count = sum(count for count, _ in other.mapped_pairs.values())
+            if count:
+                self.excluded_row_count += count
+                self.processed_excluded_waves.add(wave)
+            return
+
+        if classification == "brush":
+            count = sum(count for count, _ in other.mapped_pairs.values())
+            if count:
+                self.brush_wave_rows[wave] += count
+                self.processed_brush_waves.add(wave)
+            for output, (count, first_position) in other.mapped_pairs.items():
+                self._add_brush(output, count, first_position)
+            return
+
+        for key, (orders, quantity) in other.totals.items():
+            self._add(key, orders, quantity, other.first_touch[key])
+        if not self.classify_waves:
+            # 同一波次分块汇总的结果合并时，映射组合的行数相加、首行位置取最小值
+            for output, (count, first_position) in other.mapped_pairs.items():
+                stats = self.mapped_pairs.setdefault(output, [0, first_position])
+                stats[0] += count
+                stats[1] = min(stats[1], first_position)
+        if other.wave_totals:
+            for key, (orders, quantity) in other.wave_totals.items():
+                totals = self.wave_totals.setdefault(key, [0, 0])
+                totals[0] += orders
+                totals[1] += quantity
+        self._pending.extend(other._pending)
+        for key, sample in other.unmatched_waves.items():
+            self.unmatched_waves[key].merge(sample)
+        for key, sample in other.partial_unmatched_waves.items():
+            self.partial_unmatched_waves[key].merge(sample)
+        self.has_unmatched_codes |= other.has_unmatched_codes
+        for key, count in other.brush_wave_rows.items():
+            self.brush_wave_rows[key] += count
+        self.excluded_row_count += other.excluded_row_count
+        self.processed_excluded_waves |= other.processed_excluded_waves
+        self.processed_brush_waves |= other.processed_brush_waves
+
+    def feed(self, df):
+        """汇总一个数据块，需包含 打印波次 / 店铺 / 货品商家编码 / 订单类型 四列"""
+        if df.empty:
+            return
+
+        proc = self.processor
+        sub_handler = proc.sub_table_handler
+        tuples = collapse_rows(df)
+        positions = tuples.positions
+        waves = tuples.waves
+        counts = tuples.counts
+
+        # ---- 波次：按不同值一次性分类（非当天 / 排除 / 刷单 / 普通），-1 表示空波次 ----
+        # 末尾多放一个普通分类，供空波次(-1)索引
+        wave_class = np.append(sub_handler.classify_waves(waves, proc.non_today_waves), WAVE_NORMAL)[tuples.wave_ids]
+
+        live = wave_class != WAVE_NON_TODAY
+
+        # ---- 映射：每个不同的(店铺, 订单类型)只查一次索引 ----
+        shops = tuples.shops
+        order_types = tuples.order_types
+        pair_ids, pair_uniques = pd.factorize(tuples.shop_ids.astype(np.int64) * len(order_types) + tuples.type_ids)
+
+        pair_shop = [shops[code // len(order_types)] for code in pair_uniques]
+        pair_type = [order_types[code % len(order_types)] for code in pair_uniques]
+        pair_lookup = proc.map_channels(pair_shop, pair_type)
+        pair_output = [output for _, output in pair_lookup]
+        pair_mapped = np.array([output is not None for output in pair_output], dtype=bool)
+
+        mapped = pair_mapped[pair_ids]
+        unmapped = live & ~mapped
+        if unmapped.any():
+            self.unmapped_row_count += int(counts[unmapped].sum())
+            # 未匹配的映射按(店铺, 订单类型)记录行数和行号最小的几行，Excel行号 = 行位置 + 2
+            rows = np.flatnonzero(unmapped[tuples.row_tuples])
+            row_pairs = pair_ids[tuples.row_tuples[rows]].astype(np.int64)
+            for pair, count, row_numbers in grouped_rows(row_pairs, positions[rows] + 2, MAPPING_SAMPLE_SIZE):
+                self.unmatched_mappings[f"{pair_lookup[pair][0]}|{pair_type[pair]}"].add_many(row_numbers, count)
+        live &= mapped
+        if self.wave_totals is not None:
+            pair_ids, pair_output = split_pairs_by_wave(pair_ids, pair_output, tuples.wave_ids, waves)
+
+        if not self.classify_waves:
+            if live.any():
+                # 不同店铺可能映射到同一(输出渠道, 输出类型)，首行位置取最小值
+                pairs, counts, firsts = tuples.group_by(pair_ids, live)
+                for pair, count, first in zip(pairs, counts.tolist(), firsts.tolist()):
+                    stats = self.mapped_pairs.setdefault(pair_output[pair], [0, first])
+                    stats[0] += count
+                    stats[1] = min(stats[1], first)
+        else:
+            # ---- 副表：排除波次 ----
+            reached = [waves[w] for w in np.unique(tuples.wave_ids[live]) if w >= 0]
+            excluded_waves, brush_waves = sub_handler.split_processed(reached)
+            self.processed_excluded_waves |= excluded_waves
+            self.processed_brush_waves |= brush_waves
+
+            excluded = live & (wave_class == WAVE_EXCLUDED)
+            self.excluded_row_count += int(counts[excluded].sum())
+            live &= ~excluded
+
+            # ---- 副表：刷单波次，单量和实际数量各记 1 ----
+            brush = live & (wave_class == WAVE_BRUSH)
+            if brush.any():
+                wave_keys, wave_counts, _ = tuples.group_by(tuples.wave_ids, brush)
+                for wave_id, count in zip(wave_keys, wave_counts.tolist()):
+                    self.brush_wave_rows[waves[wave_id]] += count
+                pairs, counts, firsts = tuples.group_by(pair_ids, brush)
+                for pair, count, first in zip(pairs, counts.tolist(), firsts.tolist()):
+                    self._add_brush(pair_output[pair], count, first)
+            live &= ~brush
+
+        if live.any():
+            self._feed_codes(tuples, live, pair_ids, pair_output)
+
+    def _feed_codes(self, tuples, live, pair_ids, pair_output):
+        """按(波次, 店铺, 类型, 编码)组合汇总编码：解析和实际数量按组合计算，乘以组合的行数"""
+        proc = self.processor
+        waves = tuples.waves
+        # 只对保留的组合中出现的编码串编号
+        code_ids = np.full(len(live), -1, dtype=np.int64)
+        live_codes, code_ids[live] = np.unique(tuples.code_ids[live], return_inverse=True)
+        code_uniques = [tuples.codes[code] for code in live_codes]
+        code_counts = np.bincount(code_ids[live], weights=tuples.counts[live], minlength=len(code_uniques))
+        cache = proc.code_cache
+        parsed = [cache.get(code, proc, int(count)) for code, count in zip(code_uniques, code_counts)]
+
+        # ---- 未匹配编码：按(波次, 编码串)记录行数和行号最小的几行 ----
+        code_valid = np.array([bool(p.valid_codes) for p in parsed], dtype=bool)
+        code_flagged = np.array([not p.valid_codes or bool(p.unmatched_codes) for p in parsed], dtype=bool)
+        flagged = live.copy()
+        flagged[live] = code_flagged[code_ids[live]]
+        if flagged.any():
+            rows = np.flatnonzero(flagged[tuples.row_tuples])
+            row_tuples = tuples.row_tuples[rows]
+            keys = (tuples.wave_ids[row_tuples].astype(np.int64) + 1) * len(parsed) + code_ids[row_tuples]
+            for key, count, row_numbers in grouped_rows(keys, tuples.positions[rows] + 2, ROW_SAMPLE_SIZE):
+                wave_id = key // len(parsed) - 1
+                entry = parsed[key % len(parsed)]
+                wave_str = waves[wave_id] if wave_id >= 0 else None
+                if not entry.codes:
+                    # 空编码视为未匹配
+                    self.unmatched_waves[wave_str].add_many(row_numbers, count, [[]] * len(row_numbers))
+                    continue
+                self.has_unmatched_codes = True
+                details = [entry.unmatched_codes] * len(row_numbers)
+                if not entry.valid_codes:
+                    self.unmatched_waves[wave_str].add_many(row_numbers, count, details)
+                else:
+                    self.partial_unmatched_waves[wave_str].add_many(row_numbers, count, details)
+
+        valid = live.copy()
+        valid[live] = code_valid[code_ids[live]]
+        if not valid.any():
+            return
+
+        # ---- 实际数量：按(映射组合, 编码串)累计行数，展开为各编码后按(输出组合, 款式)累加 ----
+        combo_ids = pair_ids.astype(np.int64) * len(parsed) + code_ids
+        combos, combo_counts, combo_firsts = tuples.group_by(combo_ids, valid)
+        self._add_quantities(combos // len(parsed), combos % len(parsed), combo_counts, combo_firsts,
+                             pair_output, parsed)
+
+        # 单量的主编码轮询与行顺序有关，按行展开保留的组合
+        valid_rows = valid[tuples.row_tuples]
+        row_tuples = tuples.row_tuples[valid_rows]
+        positions = tuples.positions[valid_rows]
+        pair_ids = pair_ids[row_tuples]
+        code_ids = code_ids[row_tuples]
+
+        # ---- 单量：主编码按行位置顺序分配，可推迟到合并之后 ----
+        self._pending.append((positions, pair_ids.astype(np.int32), pair_output, code_ids.astype(np.int32), parsed))
+        if not self.defer_selection:
+            self.resolve_selection()
+
+    def finish(self):
+        """分配所有待定的主编码并返回自身"""
+        self.resolve_selection()
+        return self
+
+    def resolve_selection(self):
+        """为待分配的行按行位置顺序选择主编码，并累加单量"""
+        if not self._pending:
+            return
+        proc = self.processor
+
+        positions = []
+        pair_ids = []
+        code_ids = []
+        pair_output = []
+        parsed = []
+        for block_positions, block_pairs, block_output, block_codes, block_parsed in self._pending:
+            positions.append(block_positions)
+            pair_ids.append(block_pairs.astype(np.int64) + len(pair_output))
+            code_ids.append(block_codes.astype(np.int64) + len(parsed))
+            pair_output.extend(block_output)
+            parsed.extend(block_parsed)
+        self._pending = []
+
+        positions = np.concatenate(positions)
+        order = np.argsort(positions, kind="stable")
+        positions = positions[order]
+        pair_ids = np.concatenate(pair_ids)[order]
+        code_ids = np.concatenate(code_ids)[order]
+
+        main_ids, main_uniques = self._select_main_codes(code_ids, parsed)
+        touches = positions * TOUCH_SCALE + np.array(
+            [min(len(p.valid_codes), TOUCH_SCALE - 1) for p in parsed], dtype=np.int64)[code_ids]
+        # 按(映射组合, 主编码)计行数和最早位置
+        combos, inverse, counts = np.unique(pair_ids * len(main_uniques) + main_ids,
+                                            return_inverse=True, return_counts=True)
+        first = np.full(len(combos), np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(first, inverse.reshape(-1), touches)
+        for combo, count, touch in zip(combos.tolist(), counts.tolist(), first.tolist()):
+            style = proc.code_dict[main_uniques[combo % len(main_uniques)]]
+            self._add_output(pair_output[combo // len(main_uniques)], style, count, 0, touch)
+
+    def _select_main_codes(self, code_ids, parsed):
+        """
+        按(候选组, 是否同数量)分批分配主编码。
+
+        与 UniformSelector.select 相同：同数量时按排序后的候选轮询，
+        否则在该组首次出现时记录的最大数量编码之间轮询；轮询序号在组内按行顺序递增。
+
+        :return: (每行主编码编号, 主编码列表)
+        """
+        selector = self.selector
+        code_batch = np.array([selector.intern(p.group_key) * 2 + p.same_quantity for p in parsed], dtype=np.int64)
+        batch_ids = code_batch[code_ids]
+        order = np.argsort(batch_ids, kind="stable")
+        bounds = np.flatnonzero(np.diff(batch_ids[order])) + 1
+        main_ids = np.empty(len(code_ids), dtype=np.int64)
+        main_index = {}
+        group_main_ids = {}
+
+        for rows in np.split(order, bounds):
+            entry = parsed[code_ids[rows[0]]]
+            group_id = selector.intern(entry.group_key)
+            picks = selector.pick_many(group_id, len(rows), entry.same_quantity, entry.max_qty_codes)
+            ids = group_main_ids.get(group_id)
+            if ids is None:
+                ids = np.array([main_index.setdefault(code, len(main_index)) for code in selector.group_codes[group_id]],
+                               dtype=np.int64)
+                group_main_ids[group_id] = ids
+            main_ids[rows] = ids[picks]
+        return main_ids, list(main_index)
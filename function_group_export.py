@@ -0,0 +1,153 @@
+# function_group_export.py
+"""
+分组结果导出到列式存储
+
+配置 group_export 后，每次计算按 (订单渠道, 订单类型, 款式, 打印波次) 的汇总结果追加到导出目录，
+看板可直接按日期、渠道、款式查询趋势，不需要再打开各次的 输出结果.xlsx：
+- sqlite：group_results.sqlite，group_results 表分批 executemany 写入（渠道、款式、日期建有索引），
+  group_runs 表记录每次计算
+- parquet：group_results/run_date=YYYY-MM-DD/<run_id>.parquet，按日期分区，需要安装 pyarrow
+
+每行带 run_date（计算日期，即运行计算当天，不是订单或波次的日期）和 run_id（本次计算的编号），
+同一天多次计算时按 run_id 区分；补算往日的订单时 run_date 仍为计算当天。
+只导出 输出结果.xlsx 中出现的组（单量大于0），同一组各波次相加与 输出结果.xlsx 一致。
+"""
+import os
+import sqlite3
+import uuid
+from datetime import datetime
+
+from function_config_manager import get_config_path
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# 导出行的列：(订单渠道, 订单类型, 款式, 打印波次, 单量, 实际数量)
+RESULT_COLUMNS = ["channel", "order_type", "style", "wave", "orders", "quantity"]
+# SQLite 每批写入的行数
+BATCH_SIZE = 5000
+
+
+def get_export_dir():
+    """默认导出目录：配置文件所在目录下的 export"""
+    return str(get_config_path().parent / "export")
+
+
+def new_run_id(now=None):
+    """本次计算的编号：时间 + 随机后缀"""
+    now = now or datetime.now()
+    return f"{now:%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+def export_rows(wave_totals, result_keys):
+    """
+    需要导出的行，按 渠道、类型、款式、波次 排序
+
+    :param wave_totals: GroupAggregator.wave_totals
+    :param result_keys: 输出结果中出现的 (渠道, 类型, 款式) 集合
+    :return: [(渠道, 类型, 款式, 波次, 单量, 实际数量), ...]
+    """
+    rows = [
+        (channel, order_type, style, wave, int(orders), int(quantity))
+        for (channel, order_type, style, wave), (orders, quantity) in wave_totals.items()
+        if (channel, order_type, style) in result_keys
+    ]
+    rows.sort(key=lambda row: (row[0], row[1], row[2], row[3] or ""))
+    return rows
+
+
+class SqliteExporter:
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS group_runs (
+            run_id TEXT PRIMARY KEY,
+            run_date TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            order_file TEXT,
+            result_rows INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS group_results (
+            run_id TEXT NOT NULL,
+            run_date TEXT NOT NULL,
+            channel TEXT,
+            order_type TEXT,
+            style TEXT,
+            wave TEXT,
+            orders INTEGER NOT NULL,
+            quantity INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_group_results_date ON group_results (run_date);
+        CREATE INDEX IF NOT EXISTS idx_group_results_channel ON group_results (channel, run_date);
+        CREATE INDEX IF NOT EXISTS idx_group_results_style ON group_results (style, run_date);
+        CREATE INDEX IF NOT EXISTS idx_group_results_run ON group_results (run_id);
+    """
+
+    def export(self, export_dir, run, rows):
+        path = os.path.join(export_dir, "group_results.sqlite")
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            conn.executescript(self.SCHEMA)
+            # 一次计算的结果在同一个事务中写入，中途失败时不留下不完整的数据
+            with conn:
+                conn.execute(
+                    "INSERT INTO group_runs (run_id, run_date, created_at, order_file, result_rows) VALUES (?, ?, ?, ?, ?)",
+                    (run["run_id"], run["run_date"], run["created_at"], run["order_file"], len(rows)),
+                )
+                prefix = (run["run_id"], run["run_date"])
+                for start in range(0, len(rows), BATCH_SIZE):
+                    conn.executemany(
+                        "INSERT INTO group_results (run_id, run_date, channel, order_type, style, wave, orders, quantity)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [prefix + row for row in rows[start:start + BATCH_SIZE]],
+                    )
+        finally:
+            conn.close()
+        return path
+
+
+class ParquetExporter:
+    name = "parquet"
+
+    def export(self, export_dir, run, rows):
+        if pyarrow is None:
+            raise ImportError("导出 Parquet 需要安装 pyarrow")
+        directory = os.path.join(export_dir, "group_results", f"run_date={run['run_date']}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{run['run_id']}.parquet")
+
+        columns = list(zip(*rows)) if rows else [()] * len(RESULT_COLUMNS)
+        # run_date 由分区目录给出，不重复写入文件
+        table = pyarrow.table({
+            "run_id": pyarrow.array([run["run_id"]] * len(rows), pyarrow.string()),
+            **{name: pyarrow.array(values, pyarrow.string()) for name, values in zip(RESULT_COLUMNS[:4], columns[:4])},
+            **{name: pyarrow.array(values, pyarrow.int64()) for name, values in zip(RESULT_COLUMNS[4:], columns[4:])},
+        })
+        tmp_path = path + ".tmp"
+        pyarrow.parquet.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+
+EXPORTERS = {
+    SqliteExporter.name: SqliteExporter,
+    ParquetExporter.name: ParquetExporter,
+}
+
+
+def export_results(export_format, export_dir, run, rows):
+    """
+    追加一次计算的结果
+
+    :param run: {"run_id", "run_date", "created_at", "order_file"}，run_date 为计算日期 YYYY-MM-DD
+    :return: 写入的文件路径
+    """
+    exporter_class = EXPORTERS.get(export_format)
+    if exporter_class is None:
+        raise ValueError(f"未知的导出格式: {export_format}")
+    export_dir = export_dir or get_export_dir()
+    os.makedirs(export_dir, exist_ok=True)
+    return exporter_class().export(export_dir, run, rows)
@@ -0,0 +1,209 @@
+# function_group_incremental.py
+"""
+分组计算增量模块
+
+每次计算后按波次保存部分汇总结果（以 打印波次 + 行内容指纹 为键）。
+下次计算时，指纹未变的波次直接复用保存的结果，只对新增或内容变化的波次重新汇总。
+保存的部分结果不区分副表分类，副表中排除 / 刷单波次变化时按新的分类重新组合即可；
+主编码在全部波次合并后按行顺序统一分配，结果与完整重算一致。
+工作进程数（group_workers）大于1时，需要重新汇总的波次交给 ParallelWaveAggregation 在进程池中汇总。
+存储按订单文件路径各保存一个，只保留最近使用的 MAX_STORES 个，其余在保存时删除。
+"""
+import glob
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from function_group_engine import GroupAggregator, factorize_waves
+from function_group_parallel import ParallelWaveAggregation
+from function_reference_cache import get_cache_dir
+from function_group_sub_table import WAVE_EXCLUDED, WAVE_BRUSH
+
+# 存储格式变化时递增，旧存储自动失效
+STORE_VERSION = 2
+# 保留的存储个数（每个订单文件路径一个），超出时删除最久未使用的
+MAX_STORES = 20
+
+# 波次分类 -> GroupAggregator.merge 的 classification
+CLASSIFICATIONS = {WAVE_EXCLUDED: "excluded", WAVE_BRUSH: "brush"}
+
+
+class WavePartial:
+    """单个波次的部分汇总"""
+    __slots__ = ("fingerprint", "aggregator")
+
+    def __init__(self, fingerprint, aggregator):
+        self.fingerprint = fingerprint
+        self.aggregator = aggregator
+
+    def __getstate__(self):
+        return self.fingerprint, self.aggregator
+
+    def __setstate__(self, state):
+        self.fingerprint, self.aggregator = state
+
+
+class WaveStore:
+    """波次部分汇总的持久化存储，按订单文件路径区分；每次计算都会保存，文件修改时间即最近使用时间"""
+
+    def __init__(self, order_path, cache_dir=None, max_stores=MAX_STORES):
+        self.cache_dir = cache_dir or get_cache_dir()
+        self.max_stores = max_stores
+        name = hashlib.sha1(os.path.abspath(order_path).encode('utf-8')).hexdigest()[:12]
+        self.store_path = os.path.join(self.cache_dir, f"waves_{name}.pkl")
+
+    def load(self, reference_signature, wave_breakdown=False):
+        """读取上次保存的 {波次: WavePartial}，编码对应关系或是否按波次汇总变化、存储损坏时返回空字典"""
+        try:
+            with open(self.store_path, 'rb') as f:
+                stored = pickle.load(f)
+        except Exception:
+            return {}
+
+        if stored.get("version") != STORE_VERSION or stored.get("reference") != reference_signature:
+            return {}
+        if stored.get("wave_breakdown", False) != wave_breakdown:
+            return {}
+        return stored.get("waves", {})
+
+    def save(self, reference_signature, partials, wave_breakdown=False):
+        """保存本次的波次部分汇总，失败时只打印提示，不影响计算"""
+        try:
+            payload = {"version": STORE_VERSION, "reference": reference_signature, "waves": partials,
+                       "wave_breakdown": wave_breakdown}
+            os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
+            tmp_path = self.store_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.store_path)
+            self.evict()
+        except Exception as e:
+            print(f"保存波次增量数据失败: {str(e)}")
+
+    def evict(self):
+        """只保留最近保存的 max_stores 个存储，删除其余的（已改名或按日期导出的旧订单文件）"""
+        paths = glob.glob(os.path.join(self.cache_dir, "waves_*.pkl"))
+        if len(paths) <= self.max_stores:
+            return
+
+        def modified(path):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0
+
+        paths.sort(key=modified, reverse=True)
+        for path in paths[self.max_stores:]:
+            if os.path.abspath(path) == os.path.abspath(self.store_path):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class IncrementalAggregation:
+    """
+    按波次增量汇总
+
+    feed() 与 GroupAggregator.feed() 用法相同；读取结束后调用 finish() 得到合并后的汇总器。
+    """
+
+    def __init__(self, processor, reader):
+        self.processor = processor
+        self.reader = reader
+        self.store = WaveStore(reader.file_path)
+        self.stored = self.store.load(processor.reference_signature, processor.wave_breakdown)
+
+        # 波次首次出现的顺序
+        self.wave_order = []
+        self._hashers = {}
+        # 本次需要重新汇总的波次
+        self._fresh = {}
+        self.reused_waves = []
+        self.rebuilt_waves = []
+        # 多进程汇总需要重新汇总的波次，单进程时为None
+        self.parallel = ParallelWaveAggregation(processor, processor.workers) if processor.workers > 1 else None
+
+    def _wave_aggregator(self, wave):
+        aggregator = self._fresh.get(wave)
+        if aggregator is None:
+            aggregator = GroupAggregator(self.processor, defer_selection=True, classify_waves=False)
+            self._fresh[wave] = aggregator
+        return aggregator
+
+    def feed(self, chunk, rebuild=None):
+        """
+        :param rebuild: 为None时计算全部波次的指纹并汇总新波次；
+                        否则只汇总给定集合中的波次（第二遍读取内容变化的波次）
+        """
+        if chunk.empty:
+            return
+
+        wave_ids, waves = factorize_waves(chunk['打印波次'])
+        row_hashes = None
+        if rebuild is None:
+            row_hashes = pd.util.hash_pandas_object(chunk, index=True).to_numpy()
+
+        order = np.argsort(wave_ids, kind="stable")
+        bounds = np.flatnonzero(np.diff(wave_ids[order])) + 1
+        fresh_rows = []
+        for rows in np.split(order, bounds):
+            wave_id = wave_ids[rows[0]]
+            wave = waves[wave_id] if wave_id >= 0 else None
+
+            if rebuild is None:
+                hasher = self._hashers.get(wave)
+                if hasher is None:
+                    hasher = self._hashers[wave] = hashlib.sha1()
+                    self.wave_order.append(wave)
+                hasher.update(row_hashes[rows].tobytes())
+                if wave in self.stored:
+                    continue
+            elif wave not in rebuild:
+                continue
+
+            if self.parallel is not None:
+                fresh_rows.append(rows)
+            else:
+                self._wave_aggregator(wave).feed(chunk.iloc[rows])
+
+        if fresh_rows:
+            self.parallel.feed(chunk.iloc[np.sort(np.concatenate(fresh_rows))])
+
+    def close(self):
+        """关闭多进程汇总的进程池（未调用 finish() 就结束时）"""
+        if self.parallel is not None:
+            self.parallel.close()
+
+    def finish(self):
+        """复用未变化的波次，重新汇总内容变化的波次，保存并返回合并后的汇总器"""
+        fingerprints = {wave: hasher.hexdigest() for wave, hasher in self._hashers.items()}
+        changed = {wave for wave in self.wave_order
+                   if wave in self.stored and self.stored[wave].fingerprint != fingerprints[wave]}
+        if changed:
+            for chunk in self.reader.reopen().chunks():
+                self.feed(chunk, rebuild=changed)
+        if self.parallel is not None:
+            self._fresh.update(self.parallel.finish())
+
+        partials = {}
+        for wave in self.wave_order:
+            if wave in self._fresh:
+                partials[wave] = WavePartial(fingerprints[wave], self._fresh[wave])
+                self.rebuilt_waves.append(wave)
+            else:
+                partials[wave] = self.stored[wave]
+                self.reused_waves.append(wave)
+        self.store.save(self.processor.reference_signature, partials, self.processor.wave_breakdown)
+
+        # 按当前副表分类组合各波次，再统一分配主编码
+        wave_classes = self.processor.sub_table_handler.classify_waves(self.wave_order)
+        aggregator = GroupAggregator(self.processor, defer_selection=True)
+        for wave, wave_class in zip(self.wave_order, wave_classes):
+            classification = CLASSIFICATIONS.get(wave_class, "normal")
+            aggregator.merge(partials[wave].aggregator, classification, wave)
+        return aggregator.finish()
@@ -0,0 +1,203 @@
+# function_group_parallel.py
+"""
+分组计算多进程汇总
+
+按打印波次把订单行分片，交给进程池中的工作进程各自汇总，主进程按提交顺序合并。
+各分片不分配主编码，合并后按行位置统一分配，因此结果与单进程完全一致且可复现。
+数据量较小时不启动进程池，直接在当前进程汇总。
+
+ParallelAggregation 用于不增量计算时；增量计算（默认）中需要重新汇总的波次由 ParallelWaveAggregation 分片，
+各波次的结果单独返回，供 function_group_incremental 保存。
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from function_group_engine import GroupAggregator, factorize_waves
+
+# 累计行数达到该值后才启用进程池
+PARALLEL_MIN_ROWS = 50000
+
+# 工作进程内共用的参考数据（ExcelContrastProcessor.shared_context() 的结果），由 init_worker 设置
+_worker_context = None
+# 按 _worker_context 创建的处理器，首次使用时创建
+_worker_processor = None
+
+
+def init_worker(context):
+    """进程池的初始化函数：保存主进程已加载的参考数据，同一工作进程中的各任务共用"""
+    global _worker_context, _worker_processor
+    _worker_context = context
+    _worker_processor = None
+
+
+def worker_context():
+    """当前工作进程的参考数据"""
+    return _worker_context
+
+
+def worker_processor():
+    """当前工作进程的处理器（不读写文件），首次调用时按参考数据创建"""
+    global _worker_processor
+    if _worker_processor is None:
+        from function_group_calculation import ExcelContrastProcessor
+
+        processor = ExcelContrastProcessor.from_context(_worker_context, None, None)
+        processor.non_today_waves = _worker_context["non_today_waves"]
+        _worker_processor = processor
+    return _worker_processor
+
+
+def _aggregate_shard(shard):
+    aggregator = GroupAggregator(worker_processor(), defer_selection=True)
+    aggregator.feed(shard)
+    return aggregator
+
+
+def feed_by_wave(aggregators, df, processor):
+    """
+    按波次分别汇总（不区分副表分类，不分配主编码），结果累加到 aggregators {波次: 汇总器} 中
+
+    空波次的键为None。
+    """
+    wave_ids, waves = factorize_waves(df['打印波次'])
+    order = np.argsort(wave_ids, kind="stable")
+    bounds = np.flatnonzero(np.diff(wave_ids[order])) + 1
+    for rows in np.split(order, bounds):
+        wave_id = wave_ids[rows[0]]
+        wave = waves[wave_id] if wave_id >= 0 else None
+        aggregator = aggregators.get(wave)
+        if aggregator is None:
+            aggregator = aggregators[wave] = GroupAggregator(processor, defer_selection=True, classify_waves=False)
+        aggregator.feed(df.iloc[rows])
+    return aggregators
+
+
+def _aggregate_waves(shard):
+    return feed_by_wave({}, shard, worker_processor())
+
+
+def _start_executor(processor, workers):
+    context = processor.shared_context()
+    context["non_today_waves"] = processor.non_today_waves
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(context,))
+
+
+def shard_by_wave(df, shard_count):
+    """
+    按波次把数据块分为至多 shard_count 片，同一波次的行在同一片中
+
+    波次按首次出现顺序依次分给当前行数最少的分片，分片结果只取决于数据本身。
+    """
+    wave_ids, waves = factorize_waves(df['打印波次'])
+    wave_ids = wave_ids + 1  # 空波次(-1)作为编号 0
+    wave_rows = np.bincount(wave_ids, minlength=len(waves) + 1)
+
+    shard_rows = [0] * shard_count
+    wave_shard = np.zeros(len(wave_rows), dtype=np.int64)
+    for wave_id in range(len(wave_rows)):
+        if wave_rows[wave_id] == 0:
+            continue
+        target = shard_rows.index(min(shard_rows))
+        wave_shard[wave_id] = target
+        shard_rows[target] += int(wave_rows[wave_id])
+
+    row_shard = wave_shard[wave_ids]
+    return [df[row_shard == shard] for shard in range(shard_count) if shard_rows[shard]]
+
+
+class ShardedAggregation:
+    """
+    多进程汇总的公共部分：累计行数达到 PARALLEL_MIN_ROWS 后启动进程池，之后的数据块按波次分片提交
+
+    子类提供工作进程中执行的 task（参数为一个分片）和数据量小时在当前进程汇总的 feed_local()。
+    不调用 finish() 就结束时（取消、出错）需要调用 close() 关闭进程池。
+
+    :param workers: 工作进程数
+    """
+
+    task = None
+
+    def __init__(self, processor, workers):
+        self.processor = processor
+        self.workers = workers
+        self.row_count = 0
+        self._executor = None
+        self._futures = []
+
+    def feed_local(self, df):
+        raise NotImplementedError
+
+    def feed(self, df):
+        self.row_count += len(df)
+        # 数据量小时直接在当前进程汇总
+        if self._executor is None and self.row_count < PARALLEL_MIN_ROWS:
+            self.feed_local(df)
+            return
+
+        if self._executor is None:
+            self._executor = _start_executor(self.processor, self.workers)
+        for shard in shard_by_wave(df, self.workers):
+            self._futures.append(self._executor.submit(self.task, shard))
+
+    def close(self):
+        """关闭进程池，未开始的分片不再计算；finish() 中自动调用，可重复调用"""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        self._futures = []
+
+
+class ParallelAggregation(ShardedAggregation):
+    """多进程汇总，用法与 GroupAggregator 相同：多次 feed() 后调用 finish() 得到汇总器"""
+
+    task = staticmethod(_aggregate_shard)
+
+    def __init__(self, processor, workers):
+        super().__init__(processor, workers)
+        self.local = GroupAggregator(processor, defer_selection=True)
+
+    def feed_local(self, df):
+        self.local.feed(df)
+
+    def finish(self):
+        """按提交顺序合并各分片结果并分配主编码"""
+        aggregator = GroupAggregator(self.processor, defer_selection=True)
+        aggregator.merge(self.local)
+        try:
+            for future in self._futures:
+                aggregator.merge(future.result())
+        finally:
+            self.close()
+        return aggregator.finish()
+
+
+class ParallelWaveAggregation(ShardedAggregation):
+    """
+    按波次分别汇总的多进程版本（增量计算中需要重新汇总的波次）
+
+    feed() 送入只含这些波次的数据块，按波次分片交给工作进程；finish() 按提交顺序把同一波次的结果合并，
+    返回 {波次: 汇总器}，与逐块调用 feed_by_wave 的结果相同。
+    """
+
+    task = staticmethod(_aggregate_waves)
+
+    def __init__(self, processor, workers):
+        super().__init__(processor, workers)
+        self.local = {}
+
+    def feed_local(self, df):
+        feed_by_wave(self.local, df, self.processor)
+
+    def finish(self):
+        waves = self.local
+        try:
+            for future in self._futures:
+                for wave, aggregator in future.result().items():
+                    if wave in waves:
+                        waves[wave].merge(aggregator)
+                    else:
+                        waves[wave] = aggregator
+        finally:
+            self.close()
+        return waves
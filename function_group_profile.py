@@ -0,0 +1,199 @@
+# function_group_profile.py
+"""
+分组计算计时与性能分析
+
+RunProfile 记录一次计算中各阶段的用时（可嵌套，如 map/feed）、行数等计数和缓存命中率，
+按配置可选地开启 cProfile（函数耗时）和 tracemalloc（内存峰值与分配最多的位置）。
+计算完成后写入 输出结果.xlsx 旁的 JSON 文件（输出结果.profile.json）。
+
+配置项：
+- group_profile：开启 cProfile
+- group_trace_memory：开启 tracemalloc
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# cProfile / tracemalloc 报告中保留的条目数
+PROFILE_TOP = 30
+
+
+class StageTiming:
+    """单个阶段的累计用时，同一阶段多次进入时累加"""
+    __slots__ = ("seconds", "calls", "rows")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.rows = None
+
+    def to_dict(self):
+        data = {"seconds": round(self.seconds, 6), "calls": self.calls}
+        if self.rows is not None:
+            data["rows"] = self.rows
+        return data
+
+
+class RunProfile:
+    """
+    一次分组计算的计时记录
+
+    用 stage(name) 包住各阶段，嵌套的阶段以 "/" 连接为路径（如 "map/feed"）；
+    counters 保存行数、缓存命中等数值；start() / stop() 开启和结束可选的 cProfile、tracemalloc。
+    """
+
+    def __init__(self, profile=False, trace_memory=False):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        # 阶段路径 -> StageTiming，按首次进入的顺序
+        self.stages = {}
+        self.counters = {}
+        self.started_at = None
+        self._path = []
+        self._profiler = None
+        self._trace_started = False
+        self._running = False
+        self.profile_stats = None
+        self.memory_stats = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(bool(config.get("group_profile", False)), bool(config.get("group_trace_memory", False)))
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """计时一个阶段，rows 为该阶段处理的行数（可在阶段内用 set_rows 设置）"""
+        self._path.append(name)
+        path = "/".join(self._path)
+        timing = self.stages.get(path)
+        if timing is None:
+            timing = self.stages[path] = StageTiming()
+        if rows is not None:
+            timing.rows = rows
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            timing.seconds += time.perf_counter() - start
+            timing.calls += 1
+            self._path.pop()
+
+    def count(self, name, value):
+        self.counters[name] = value
+
+    def start(self):
+        """开始计时并按配置开启 cProfile / tracemalloc；已开始时返回False"""
+        if self._running:
+            return False
+        self._running = True
+        self.started_at = datetime.now()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._trace_started = True
+        if self.profile:
+            try:
+                self._profiler = cProfile.Profile()
+                self._profiler.enable()
+            except Exception as e:
+                # 其它分析工具已在运行时无法开启
+                self._profiler = None
+                print(f"开启性能分析失败: {str(e)}")
+        return True
+
+    def stop(self):
+        """结束 cProfile / tracemalloc 并整理报告"""
+        if not self._running:
+            return
+        self._running = False
+        if self._profiler is not None:
+            self._profiler.disable()
+            self.profile_stats = self._profile_report(self._profiler)
+            self._profiler = None
+        if self._trace_started:
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                self.memory_stats = {
+                    "current_bytes": current,
+                    "peak_bytes": peak,
+                    "top": [
+                        {"location": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+                        for stat in snapshot.statistics("lineno")[:PROFILE_TOP]
+                    ],
+                }
+            finally:
+                tracemalloc.stop()
+                self._trace_started = False
+
+    @staticmethod
+    def _profile_report(profiler):
+        """按累计用时取前 PROFILE_TOP 个函数"""
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        rows = []
+        for (file_name, line, func), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({
+                "function": f"{os.path.basename(file_name)}:{line}({func})",
+                "calls": calls,
+                "total_seconds": round(total, 6),
+                "cumulative_seconds": round(cumulative, 6),
+            })
+        rows.sort(key=lambda row: row["cumulative_seconds"], reverse=True)
+        return rows[:PROFILE_TOP]
+
+    def summary_text(self, stage_names):
+        """
+        顶层阶段用时的一行摘要，子阶段写在括号中
+
+        :param stage_names: {阶段键: 显示名称}，未列出的阶段使用键本身
+        """
+        parts = []
+        for path, timing in self.stages.items():
+            if "/" in path:
+                continue
+            children = [
+                f"{stage_names.get(child.rsplit('/', 1)[1], child.rsplit('/', 1)[1])} {sub.seconds:.2f}"
+                for child, sub in self.stages.items()
+                if child.rsplit("/", 1)[0] == path and child.count("/") == 1
+            ]
+            text = f"{stage_names.get(path, path)} {timing.seconds:.2f} 秒"
+            if children:
+                text += f"（{'，'.join(children)}）"
+            parts.append(text)
+        return "，".join(parts)
+
+    def to_dict(self):
+        data = {
+            "started_at": self.started_at.isoformat(timespec="seconds") if self.started_at else None,
+            "stages": {path: timing.to_dict() for path, timing in self.stages.items()},
+            "counters": self.counters,
+        }
+        if self.profile_stats is not None:
+            data["cprofile"] = self.profile_stats
+        if self.memory_stats is not None:
+            data["tracemalloc"] = self.memory_stats
+        return data
+
+
+def sidecar_path(output_path):
+    """输出结果.xlsx -> 输出结果.profile.json"""
+    return os.path.splitext(output_path)[0] + ".profile.json"
+
+
+def write_sidecar(output_path, data):
+    """写出 JSON 报告，失败时只打印提示，不影响计算结果"""
+    path = sidecar_path(output_path)
+    try:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        print(f"写出计时报告失败: {str(e)}")
+        return None
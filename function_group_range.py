@@ -0,0 +1,299 @@
+# function_group_range.py
+"""
+分组计算日期范围模式
+
+一次处理多个订单导出文件（或整个目录，由 expand_inputs 展开）中一段日期内的订单，用于周报等跨天汇总：
+按波次中的日期（PB + yymmdd）分天，每天按 (订单渠道, 订单类型, 款式) 汇总，
+写出一个多 sheet 的输出文件——「汇总」为整个日期范围的合计，其后每天一个 sheet。
+
+- 各文件在进程池中并行读取和汇总，只有一个文件时在当前进程完成
+- 同一文件内每天单独汇总，与用当天的文件单独运行一次相同（主编码的均匀选择按天进行），
+  不同文件中的同一天再相加
+- PB 后为有效日期（yymmdd，任一年份）的波次按日期归入各天，日期范围外的忽略；
+  无法识别日期的波次放在「未识别日期」sheet，同样计入汇总
+- 副表中没有匹配到的波次按整个日期范围提示一次
+"""
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from function_group_engine import GroupAggregator, GroupResult
+from function_group_parallel import init_worker, worker_context
+from function_group_reader import READERS, open_order_reader, wave_days
+
+SUMMARY_SHEET = "汇总"
+UNDATED_SHEET = "未识别日期"
+# 日期范围最多的天数，避免输错年份时生成大量 sheet
+MAX_RANGE_DAYS = 366
+
+
+def parse_day(value):
+    """date / datetime / 'YYYY-MM-DD' / 'YYYYMMDD' 转为 date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for date_format in ("%Y-%m-%d", "%Y%m%d", "%Y/%m/%d"):
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"无法识别的日期: {value}")
+
+
+def range_days(start, end):
+    """起止日期（含）内每天的 yymmdd"""
+    start, end = parse_day(start), parse_day(end)
+    if end < start:
+        raise ValueError("结束日期早于开始日期")
+    count = (end - start).days + 1
+    if count > MAX_RANGE_DAYS:
+        raise ValueError(f"日期范围不能超过 {MAX_RANGE_DAYS} 天")
+    return [(start + timedelta(days=offset)).strftime("%y%m%d") for offset in range(count)]
+
+
+def is_generated(path):
+    """Excel 临时文件或本程序生成的输出文件"""
+    name = os.path.basename(path)
+    stem, extension = os.path.splitext(name)
+    return name.startswith("~$") or (extension.lower() == ".xlsx" and
+                                     (stem.endswith("输出结果") or stem.startswith("输出结果")))
+
+
+def expand_inputs(patterns):
+    """展开通配符和目录（目录下的 xlsx / csv / parquet / arrow 文件），按路径排序并去重"""
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            extensions = (".xlsx",) + tuple(READERS)
+            matches = [path for path in glob.glob(os.path.join(pattern, "*"))
+                       if os.path.splitext(path)[1].lower() in extensions]
+        else:
+            matches = glob.glob(pattern) or [pattern]
+        for path in sorted(matches):
+            # 跳过 Excel 临时文件和本程序生成的输出文件（输入文件名_输出结果.xlsx / 输出结果_开始日期-结束日期.xlsx）
+            if is_generated(path):
+                continue
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def day_title(day):
+    """yymmdd -> 2024-05-01，空字符串为 未识别日期"""
+    if not day:
+        return UNDATED_SHEET
+    return f"20{day[:2]}-{day[2:4]}-{day[4:6]}"
+
+
+def range_output_name(start, end):
+    """日期范围模式的默认输出文件名"""
+    return f"输出结果_{parse_day(start):%Y%m%d}-{parse_day(end):%Y%m%d}.xlsx"
+
+
+class DayPartial:
+    """一个文件中某一天的汇总结果"""
+    __slots__ = ("totals", "first_touch", "messages", "processed_waves", "rows")
+
+    def __init__(self, totals, first_touch, messages, processed_waves, rows):
+        self.totals = totals
+        self.first_touch = first_touch
+        self.messages = messages
+        self.processed_waves = processed_waves
+        self.rows = rows
+
+    def __getstate__(self):
+        return self.totals, self.first_touch, self.messages, self.processed_waves, self.rows
+
+    def __setstate__(self, state):
+        self.totals, self.first_touch, self.messages, self.processed_waves, self.rows = state
+
+
+class FileDays:
+    """一个文件的读取结果：各天的汇总、校验结果和错误信息"""
+
+    def __init__(self, order_path):
+        self.order_path = order_path
+        self.days = {}
+        self.report = None
+        self.error = None
+        self.elapsed = 0.0
+
+    @property
+    def name(self):
+        return os.path.basename(self.order_path)
+
+
+def _row_days(waves):
+    """分类列 打印波次 中各行的日期，只对不同的波次计算一次"""
+    categories = pd.Series(waves.cat.categories.astype(str)).str.strip()
+    return wave_days(categories)[waves.cat.codes.to_numpy()]
+
+
+def calculate_file_days(context, order_path, days):
+    """
+    读取一个文件，只保留 days 中各天和无法识别日期的波次，按天汇总
+
+    :param context: ExcelContrastProcessor.shared_context() 的结果
+    :param days: 日期列表 [yymmdd, ...]
+    :return: FileDays
+    """
+    from function_group_calculation import ExcelContrastProcessor
+
+    start_time = time.time()
+    result = FileDays(order_path)
+    processors = {}
+    aggregators = {}
+    rows = {}
+    try:
+        reader = open_order_reader(order_path)
+        reader.days = list(days)
+        for chunk in reader.chunks():
+            row_days = _row_days(chunk['打印波次'])
+            for day in np.unique(row_days).tolist():
+                aggregator = aggregators.get(day)
+                if aggregator is None:
+                    processor = ExcelContrastProcessor.from_context(context, order_path, None)
+                    processor.incremental = False
+                    processor.sub_table_warnings = False
+                    processors[day] = processor
+                    aggregator = aggregators[day] = GroupAggregator(processor)
+                    rows[day] = 0
+                mask = row_days == day
+                aggregator.feed(chunk[mask])
+                rows[day] += int(mask.sum())
+    except Exception as e:
+        result.error = f"读取数据时出错: {str(e)}"
+        result.elapsed = time.time() - start_time
+        return result
+
+    result.report = reader.report
+    result.error = ExcelContrastProcessor.reading_error(reader)
+    if result.error is None:
+        for day in sorted(aggregators):
+            processor = processors[day]
+            processor.summarize(aggregators[day].finish())
+            handler = processor.sub_table_handler
+            result.days[day] = DayPartial(
+                aggregators[day].totals,
+                aggregators[day].first_touch,
+                processor.messages,
+                handler.processed_excluded_waves | handler.processed_brush_waves,
+                rows[day],
+            )
+    result.elapsed = time.time() - start_time
+    return result
+
+
+def _calculate_in_worker(order_path, days):
+    return calculate_file_days(worker_context(), order_path, days)
+
+
+class RangeTotals:
+    """多个文件、多天的结果合并：键相同的组相加，首次出现位置取 (文件序号, 文件内位置) 的最小值"""
+
+    def __init__(self):
+        self.totals = {}
+        self.first_touch = {}
+        self.messages = []
+        self.rows = 0
+
+    def add(self, file_index, partial):
+        for key, (orders, quantity) in partial.totals.items():
+            touch = (file_index, partial.first_touch[key])
+            totals = self.totals.get(key)
+            if totals is None:
+                self.totals[key] = [orders, quantity]
+                self.first_touch[key] = touch
+                continue
+            totals[0] += orders
+            totals[1] += quantity
+            if touch < self.first_touch[key]:
+                self.first_touch[key] = touch
+        self.rows += partial.rows
+
+    def result(self, processor):
+        return processor.sort_result(GroupResult.from_totals(self.totals, self.first_touch))
+
+
+def load_files(context, order_paths, days, jobs=1, on_file=None):
+    """
+    读取并按天汇总各文件，jobs 大于1且有多个文件时在进程池中并行
+
+    :param on_file: 每个文件完成时调用，参数为 FileDays
+    :return: 与 order_paths 顺序一致的 FileDays 列表
+    """
+    results = []
+    if jobs > 1 and len(order_paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(order_paths)), initializer=init_worker,
+                                 initargs=(context,)) as executor:
+            futures = [executor.submit(_calculate_in_worker, path, days) for path in order_paths]
+            for future in futures:
+                results.append(future.result())
+                if on_file is not None:
+                    on_file(results[-1])
+    else:
+        for path in order_paths:
+            results.append(calculate_file_days(context, path, days))
+            if on_file is not None:
+                on_file(results[-1])
+    return results
+
+
+def combine_files(processor, files):
+    """
+    合并各文件的结果，生成输出的各 sheet
+
+    :return: (sheets, 汇总sheet的提示消息)，sheets 为 [(sheet名称, GroupResult, 提示消息列表), ...]，
+             汇总 sheet 的消息由调用方补充后放在第一个 sheet
+    """
+    summary = RangeTotals()
+    per_day = {}
+    processed_waves = set()
+    summary_messages = []
+    skipped_waves = set()
+
+    for file_index, file_days in enumerate(files):
+        if file_days.error:
+            summary_messages.append({"text": f"{file_days.name}：{file_days.error}", "color": processor.COLOR_ERROR})
+            continue
+        skipped_waves |= file_days.report.non_today_waves
+        for day, partial in file_days.days.items():
+            day_totals = per_day.get(day)
+            if day_totals is None:
+                day_totals = per_day[day] = RangeTotals()
+            day_totals.add(file_index, partial)
+            summary.add(file_index, partial)
+            processed_waves |= partial.processed_waves
+            day_totals.messages.extend(
+                {"text": f"{file_days.name}：{msg['text']}", "color": msg["color"]} for msg in partial.messages
+            )
+
+    if skipped_waves:
+        summary_messages.append({
+            "text": f"发现日期范围外的波次，已忽略: {', '.join(sorted(skipped_waves))}",
+            "color": processor.COLOR_INFO
+        })
+
+    # 副表消息和没有匹配到的波次按整个日期范围提示
+    handler = processor.sub_table_handler
+    summary_messages.extend(handler.sub_table_messages)
+    handler.mark_processed(processed_waves)
+    summary_messages.extend(handler.get_warnings())
+
+    # 日期升序，未识别日期放在最后
+    ordered_days = sorted(day for day in per_day if day) + ([""] if "" in per_day else [])
+    sheets = [(SUMMARY_SHEET, summary.result(processor), summary_messages)]
+    for day in ordered_days:
+        day_totals = per_day[day]
+        messages = [{"text": f"共 {day_totals.rows} 行订单数据", "color": processor.COLOR_INFO}]
+        sheets.append((day_title(day), day_totals.result(processor), messages + day_totals.messages))
+    return sheets, summary_messages
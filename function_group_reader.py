@@ -0,0 +1,508 @@
+# function_group_reader.py
+"""
+订单数据流式读取
+
+以 openpyxl 只读模式逐行读取 1.xlsx，只保留分组计算需要的列，
+读取时即剔除非打单行和非当天波次，按块交给汇总器，内存占用与文件大小无关。
+
+校验后各列转为分类（category），重复的店铺、订单类型、波次、编码只保存一份。
+
+同样内容的 CSV（分块读取，各列按字符串读入）、Parquet、Arrow IPC（内存映射）文件按扩展名选择读取器，
+缺列、空值行的校验与 1.xlsx 相同。Parquet / Arrow 需要安装 pyarrow。
+
+ParsedOrderCache 在内存中保留最近一次读取的校验结果，文件未变化时重复计算不再解析文件。
+"""
+import codecs
+import copy
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+REQUIRED_COLUMNS = ['打印波次', '店铺', '货品商家编码', '订单类型', '打单员']
+# 送入汇总器的列
+ORDER_COLUMNS = ['打印波次', '店铺', '货品商家编码', '订单类型']
+
+# 与 pandas.read_excel 默认一致，视为空值的字符串
+NA_STRINGS = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"
+}
+
+
+def _convert_cell(value):
+    """与 pandas.read_excel 一致：空字符串等视为空值，整数值的浮点数转为整数"""
+    if isinstance(value, str) and value in NA_STRINGS:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _normalize_column(series):
+    """整列完成 _convert_cell 的转换，只有浮点数单元格逐个转换"""
+    values = series.astype(object)
+    if series.dtype.kind == "f":
+        return values.map(_convert_cell)
+    values = values.mask(values.isin(NA_STRINGS), None)
+    is_float = values.map(type) == float
+    if is_float.any():
+        values[is_float] = values[is_float].map(_convert_cell)
+    return values
+
+
+def wave_days(wave_str, prefixes=None):
+    """
+    波次中的日期：长度不少于10的波次取第3~8位（yymmdd），不是日期的波次为空字符串
+
+    :param wave_str: 去掉首尾空格的波次字符串序列
+    :param prefixes: 只识别以其中之一（PB + 两位年份）开头的波次；为None时识别 PB 后为有效 yymmdd 日期的全部波次
+    :return: 与 wave_str 等长的 object 数组
+    """
+    days = wave_str.str[2:8]
+    if prefixes is None:
+        dated = wave_str.str.startswith("PB") & (wave_str.str.len() >= 10) & days.str.fullmatch("[0-9]{6}")
+        dated &= pd.to_datetime(days.where(dated), format="%y%m%d", errors="coerce").notna()
+    else:
+        dated = wave_str.str[:4].isin(prefixes) & (wave_str.str.len() >= 10)
+    return np.where(dated.to_numpy(), days.to_numpy(dtype=object), "")
+
+
+class ValidationReport:
+    """
+    读取订单数据时的校验结果
+
+    计数覆盖全部行；各类问题行另外保留前 sample_size 个 Excel 行号，便于定位。
+    null_rows 保留全部空值行位置，用于生成与原来一致的错误信息。
+    """
+
+    def __init__(self, sample_size=20):
+        self.sample_size = sample_size
+        self.missing_columns = []
+        self.total_rows = 0
+        self.kept_rows = 0
+        self.null_rows = []
+        self.non_clerk_rows = 0
+        self.non_today_rows = 0
+        # 非当天波次 -> 行数
+        self.non_today_wave_rows = {}
+        # 问题类别 -> 前 sample_size 个 Excel 行号
+        self.samples = {"null": [], "non_clerk": [], "non_today": []}
+
+    @property
+    def null_row_count(self):
+        return len(self.null_rows)
+
+    @property
+    def non_today_waves(self):
+        return set(self.non_today_wave_rows)
+
+    def _sample(self, kind, positions):
+        sample = self.samples[kind]
+        room = self.sample_size - len(sample)
+        if room > 0:
+            sample.extend(int(position) + 2 for position in positions[:room])
+
+    def to_dict(self):
+        """转换为可写入 JSON 的字典"""
+        return {
+            "missing_columns": list(self.missing_columns),
+            "total_rows": self.total_rows,
+            "kept_rows": self.kept_rows,
+            "null_rows": self.null_row_count,
+            "non_clerk_rows": self.non_clerk_rows,
+            "non_today_rows": self.non_today_rows,
+            "non_today_waves": dict(sorted(self.non_today_wave_rows.items())),
+            "samples": {kind: list(rows) for kind, rows in self.samples.items()},
+        }
+
+
+class OrderStreamReader:
+    """
+    1.xlsx 流式读取器
+
+    chunks() 逐块产出 DataFrame（列为 ORDER_COLUMNS，索引为数据行位置，即 Excel行号 - 2）。
+    每块先整列校验（空值行、打单、非当天波次）再产出，校验结果记录在 report 中，
+    也可从 missing_columns / null_rows / non_today_waves 获取。
+    """
+
+    def __init__(self, file_path, sheet_name="Sheet1", chunk_size=20000):
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        self.chunk_size = chunk_size
+        # 保留的日期集合 {yymmdd}，为None时只保留当天波次（日期范围模式由调用方设置）
+        self.days = None
+        self.report = ValidationReport()
+
+    @property
+    def missing_columns(self):
+        return self.report.missing_columns
+
+    @property
+    def null_rows(self):
+        return self.report.null_rows
+
+    @property
+    def non_today_waves(self):
+        return self.report.non_today_waves
+
+    @property
+    def row_count(self):
+        return self.report.kept_rows
+
+    def reopen(self):
+        """以相同参数创建新的读取器，用于再次读取同一文件"""
+        reader = type(self)(self.file_path, self.sheet_name, self.chunk_size)
+        reader.days = self.days
+        return reader
+
+    def check_header(self, header):
+        """记录缺少的必要列，全部存在时返回True"""
+        header = [str(name) if name is not None else None for name in header]
+        self.report.missing_columns = [col for col in REQUIRED_COLUMNS if col not in header]
+        return not self.report.missing_columns
+
+    def validate(self, frame):
+        """
+        整列校验一个原始数据块（列为 REQUIRED_COLUMNS，索引为行位置），返回保留的行
+
+        出现空值行后不再产出数据，只继续记录空值行。
+        """
+        report = self.report
+        report.total_rows += len(frame)
+        frame = pd.DataFrame({col: _normalize_column(frame[col]) for col in REQUIRED_COLUMNS}, index=frame.index)
+
+        null_mask = frame.isna().any(axis=1).to_numpy()
+        if null_mask.any():
+            null_positions = frame.index[null_mask].tolist()
+            report.null_rows.extend(null_positions)
+            report._sample("null", null_positions)
+        if report.null_rows:
+            return None
+
+        clerk_mask = frame['打单员'].astype(str).str.contains('打单', regex=False).to_numpy()
+        if not clerk_mask.all():
+            report.non_clerk_rows += int((~clerk_mask).sum())
+            report._sample("non_clerk", frame.index[~clerk_mask].tolist())
+            frame = frame[clerk_mask]
+
+        # 非当天波次：PB + 年份开头、长度不少于10、第3~8位不是今天
+        # 日期范围模式：PB 后为任一年份的有效日期、不在保留的日期内
+        wave_str = frame['打印波次'].astype(str).str.strip()
+        days = wave_days(wave_str, self._wave_prefixes)
+        non_today = (days != "") & ~np.isin(days, self._days)
+        if non_today.any():
+            report.non_today_rows += int(non_today.sum())
+            report._sample("non_today", frame.index[non_today].tolist())
+            for wave, count in wave_str[non_today].value_counts(sort=False).items():
+                report.non_today_wave_rows[wave] = report.non_today_wave_rows.get(wave, 0) + int(count)
+            frame = frame[~non_today]
+
+        if frame.empty:
+            return None
+        report.kept_rows += len(frame)
+        # 重复度高的字符串列转为分类，后续映射、编码解析只按分类处理
+        return frame[ORDER_COLUMNS].astype("category")
+
+    def _start(self):
+        if self.days:
+            self._days = sorted(self.days)
+            self._wave_prefixes = None
+        else:
+            self._days = [datetime.now().strftime("%y%m%d")]
+            self._wave_prefixes = ["PB" + self._days[0][:2]]
+
+    def chunks(self):
+        self._start()
+        wb = load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            if self.sheet_name not in wb.sheetnames:
+                raise ValueError(f"Worksheet named '{self.sheet_name}' not found")
+            rows = wb[self.sheet_name].iter_rows(values_only=True)
+
+            header = next(rows, ())
+            if not self.check_header(header):
+                return
+            header = [str(name) if name is not None else None for name in header]
+            columns = [header.index(col) for col in REQUIRED_COLUMNS]
+            width = max(columns) + 1
+
+            # 只收集必要列的原始值，整块校验
+            block = [[] for _ in REQUIRED_COLUMNS]
+            index = []
+            # 全空行先挂起，后面还有数据时才计入（与 pandas 去掉末尾空行一致）
+            pending_empty = []
+            position = -1
+
+            for raw in rows:
+                position += 1
+                if not any(value is not None for value in raw):
+                    pending_empty.append(position)
+                    continue
+                if pending_empty:
+                    for empty_position in pending_empty:
+                        for values in block:
+                            values.append(None)
+                        index.append(empty_position)
+                    pending_empty = []
+
+                if len(raw) < width:
+                    raw = tuple(raw) + (None,) * (width - len(raw))
+                for values, col in zip(block, columns):
+                    values.append(raw[col])
+                index.append(position)
+
+                if len(index) >= self.chunk_size:
+                    chunk = self._validate_block(block, index)
+                    if chunk is not None:
+                        yield chunk
+                    block = [[] for _ in REQUIRED_COLUMNS]
+                    index = []
+
+            if index:
+                chunk = self._validate_block(block, index)
+                if chunk is not None:
+                    yield chunk
+        finally:
+            wb.close()
+
+    def _validate_block(self, block, index):
+        frame = pd.DataFrame(dict(zip(REQUIRED_COLUMNS, block)), index=index, dtype=object)
+        return self.validate(frame)
+
+    def read_all(self):
+        """
+        一次读出全部保留的行，各列合并后仍为分类列
+
+        各块的分类类型可能不同（如某块的编码全是数字），先按 object 合并再统一转为分类
+        """
+        chunks = list(self.chunks())
+        if not chunks:
+            return pd.DataFrame({col: [] for col in ORDER_COLUMNS}, dtype=object)
+        return pd.concat([chunk.astype(object) for chunk in chunks]).astype("category")
+
+
+class FrameOrderReader(OrderStreamReader):
+    """
+    列式文件读取器的公共部分
+
+    子类实现 header() 和 frames()（按块产出原始数据，只含 REQUIRED_COLUMNS），
+    校验与 1.xlsx 相同，由 validate() 按块整列完成。
+    """
+
+    def header(self):
+        raise NotImplementedError
+
+    def frames(self, columns):
+        raise NotImplementedError
+
+    def chunks(self):
+        self._start()
+        if not self.check_header([str(name) for name in self.header()]):
+            return
+
+        position = 0
+        for frame in self.frames(REQUIRED_COLUMNS):
+            if frame.empty:
+                continue
+            frame.index = pd.RangeIndex(position, position + len(frame))
+            position += len(frame)
+            chunk = self.validate(frame)
+            if chunk is not None:
+                yield chunk
+
+
+def detect_csv_encoding(file_path, sample_size=1 << 20):
+    """ERP导出的CSV可能是UTF-8（可带BOM）或GBK，按文件开头判断"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'gb18030'
+
+
+class CsvOrderReader(FrameOrderReader):
+    """CSV 分块读取，必要的列全部按字符串读入"""
+
+    def __init__(self, file_path, sheet_name=None, chunk_size=20000):
+        super().__init__(file_path, sheet_name, chunk_size)
+        self.encoding = detect_csv_encoding(file_path)
+
+    def header(self):
+        return pd.read_csv(self.file_path, nrows=0, encoding=self.encoding).columns
+
+    def frames(self, columns):
+        yield from pd.read_csv(self.file_path, usecols=columns, dtype={col: str for col in columns},
+                               encoding=self.encoding, chunksize=self.chunk_size)
+
+
+def _require_pyarrow(kind):
+    if pyarrow is None:
+        raise ImportError(f"读取 {kind} 文件需要安装 pyarrow")
+
+
+class ParquetOrderReader(FrameOrderReader):
+    """Parquet 按行组批量读取，只读取必要的列"""
+
+    def header(self):
+        _require_pyarrow("Parquet")
+        return pyarrow.parquet.ParquetFile(self.file_path).schema_arrow.names
+
+    def frames(self, columns):
+        parquet_file = pyarrow.parquet.ParquetFile(self.file_path)
+        try:
+            for batch in parquet_file.iter_batches(batch_size=self.chunk_size, columns=columns):
+                yield batch.to_pandas()
+        finally:
+            parquet_file.close()
+
+
+class ArrowOrderReader(FrameOrderReader):
+    """Arrow IPC（文件或流格式）以内存映射方式读取"""
+
+    def _open(self, source):
+        try:
+            return pyarrow.ipc.open_file(source)
+        except pyarrow.ArrowInvalid:
+            source.seek(0)
+            return pyarrow.ipc.open_stream(source)
+
+    def _batches(self, reader):
+        if isinstance(reader, pyarrow.ipc.RecordBatchFileReader):
+            return (reader.get_batch(i) for i in range(reader.num_record_batches))
+        return iter(reader)
+
+    def header(self):
+        _require_pyarrow("Arrow")
+        with pyarrow.memory_map(self.file_path, 'r') as source:
+            return self._open(source).schema.names
+
+    def frames(self, columns):
+        with pyarrow.memory_map(self.file_path, 'r') as source:
+            for batch in self._batches(self._open(source)):
+                yield batch.select(columns).to_pandas()
+
+
+# 扩展名 -> 读取器，其余按 xlsx 读取
+READERS = {
+    ".csv": CsvOrderReader,
+    ".parquet": ParquetOrderReader,
+    ".pq": ParquetOrderReader,
+    ".arrow": ArrowOrderReader,
+    ".feather": ArrowOrderReader,
+    ".ipc": ArrowOrderReader,
+}
+
+
+def open_order_reader(file_path, chunk_size=20000):
+    """按扩展名创建订单数据读取器"""
+    reader_class = READERS.get(os.path.splitext(file_path)[1].lower(), OrderStreamReader)
+    return reader_class(file_path, chunk_size=chunk_size)
+
+
+class RecordingOrderReader(OrderStreamReader):
+    """读取的同时记录产出的数据块，完整读完后存入 ParsedOrderCache；保留的行数超过上限时不再记录"""
+
+    def __init__(self, inner, cache, key):
+        super().__init__(inner.file_path, inner.sheet_name, inner.chunk_size)
+        self.inner = inner
+        self.cache = cache
+        self.key = key
+        self.report = inner.report
+
+    def reopen(self):
+        return self.inner.reopen()
+
+    def chunks(self):
+        recorded = []
+        rows = 0
+        for chunk in self.inner.chunks():
+            if recorded is not None:
+                rows += len(chunk)
+                if rows > self.cache.max_rows:
+                    # 大文件不常驻内存，保持流式读取的内存占用
+                    recorded = None
+                else:
+                    recorded.append(chunk)
+            yield chunk
+        if recorded is not None:
+            self.cache.store(self.key, recorded, self.report)
+
+
+class ReplayOrderReader(OrderStreamReader):
+    """重放 ParsedOrderCache 中保存的数据块和校验结果"""
+
+    def __init__(self, file_path, recorded, report):
+        super().__init__(file_path)
+        self.recorded = recorded
+        self.source_report = report
+
+    def reopen(self):
+        return ReplayOrderReader(self.file_path, self.recorded, self.source_report)
+
+    def chunks(self):
+        self.report = copy.deepcopy(self.source_report)
+        yield from self.recorded
+
+
+class ParsedOrderCache:
+    """
+    最近一次读取的订单文件的校验结果（数据块 + ValidationReport）
+
+    文件路径、修改时间、大小都未变化且仍是同一天（非当天波次按日期判断）时，reader() 返回重放读取器。
+    只保留一个文件，调用方负责加锁；保留的行数超过 max_rows 的文件不缓存，每次重新流式读取。
+    """
+
+    # 默认最多保留的行数（分类列每行约十几字节）
+    MAX_ROWS = 500000
+
+    def __init__(self, max_rows=MAX_ROWS):
+        self.max_rows = max_rows
+        self.key = None
+        self.recorded = None
+        self.report = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def file_key(file_path, chunk_size):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, chunk_size,
+                datetime.now().strftime("%y%m%d"))
+
+    def reader(self, file_path, chunk_size=20000):
+        key = self.file_key(file_path, chunk_size)
+        if key is not None and key == self.key:
+            self.hits += 1
+            return ReplayOrderReader(file_path, self.recorded, self.report)
+        self.misses += 1
+        # 先释放上一个文件的数据，读取新文件时不同时保留两份
+        self.clear()
+        inner = open_order_reader(file_path, chunk_size)
+        if key is None:
+            return inner
+        return RecordingOrderReader(inner, self, key)
+
+    def store(self, key, recorded, report):
+        self.key = key
+        self.recorded = recorded
+        self.report = copy.deepcopy(report)
+
+    def clear(self):
+        self.key = None
+        self.recorded = None
+        self.report = None
@@ -0,0 +1,76 @@
+# function_group_service.py
+"""
+常驻的分组计算服务
+
+由主窗口创建并持有，多次点击「分组计算」之间保留：
+- 编码对应关系解析结果（function_reference_cache 的内存缓存，文件修改时间和大小未变时直接使用）
+- 副表解析结果（function_group_sub_table 的缓存，可由预读线程提前解析）
+- 货品商家编码解析缓存（ParsedCodeCache）
+- 最近一次读取的订单文件（ParsedOrderCache），文件未变化时重复计算不再解析 1.xlsx；
+  保留的行数有上限，超过上限的大文件每次重新流式读取，不常驻内存
+
+只有源文件变化的部分才会重新读取。每次计算仍使用新的 ExcelContrastProcessor，
+消息、未匹配记录等单次计算的状态不会带到下一次。
+warm_up() 在后台线程中预先加载编码对应关系和副表，首次点击时不再等待。
+"""
+import threading
+
+from function_group_calculation import ExcelContrastProcessor
+from function_group_engine import ParsedCodeCache
+from function_group_reader import ParsedOrderCache
+
+
+class GroupCalculationService:
+    def __init__(self, order_path=None, reference_path=None, sub_table_path=None, output_path=None):
+        """各路径未指定时使用桌面上的文件，与 ExcelContrastProcessor 相同"""
+        self.order_path = order_path
+        self.reference_path = reference_path
+        self.sub_table_path = sub_table_path
+        self.output_path = output_path
+        self.code_cache = ParsedCodeCache()
+        self.order_cache = ParsedOrderCache()
+        # 同一时间只运行一次计算或预热，缓存对象不需要各自加锁
+        self.lock = threading.Lock()
+        self._warm_thread = None
+
+    def create_processor(self):
+        """创建共用本服务缓存的处理器"""
+        processor = ExcelContrastProcessor(self.order_path, self.reference_path, self.sub_table_path,
+                                           self.output_path)
+        processor.code_cache = self.code_cache
+        processor.order_cache = self.order_cache
+        return processor
+
+    def warm_up(self):
+        """在后台线程中加载编码对应关系和副表，已在预热时直接返回"""
+        if self._warm_thread is not None and self._warm_thread.is_alive():
+            return
+        self._warm_thread = threading.Thread(target=self._warm_up, daemon=True, name="GroupWarmUp")
+        self._warm_thread.start()
+
+    def _warm_up(self):
+        try:
+            with self.lock:
+                error = self.create_processor().load_reference_data()
+            if error:
+                print(f"分组计算预热失败: {error}")
+        except Exception as e:
+            print(f"分组计算预热失败: {str(e)}")
+
+    def run(self, progress_callback=None, cancel_event=None):
+        """
+        执行一次分组计算（与 ExcelContrastProcessor.process 相同，完成后自动打开输出文件）
+
+        :return: (是否成功, 信息)
+        """
+        with self.lock:
+            processor = self.create_processor()
+            processor.progress_callback = progress_callback
+            processor.cancel_event = cancel_event
+            return processor.process()
+
+    def stop(self):
+        """等待预热线程结束"""
+        if self._warm_thread is not None:
+            self._warm_thread.join(timeout=5)
+            self._warm_thread = None
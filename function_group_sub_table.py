@@ -1,12 +1,150 @@
 # sub_table_handler.py
+import numpy as np
 import pandas as pd
 from collections import defaultdict
 import os
+import threading
+from typing import Optional
+
+# 波次分类，classify_waves 的返回值
+WAVE_NORMAL = 0
+WAVE_EXCLUDED = 1
+WAVE_BRUSH = 2
+WAVE_NON_TODAY = 3
+
+# 副表解析结果缓存：路径 -> ((修改时间, 大小), SubTableData)
+_sub_table_cache = {}
+cache_lock = threading.Lock()
+
+# 副表后台预读线程
+watcher_thread: Optional[threading.Thread] = None
+stop_event = threading.Event()
+watcher_lock = threading.Lock()
+
+
+class SubTableData:
+    """副表的解析结果：排除 / 刷单波次，或重复数据错误，或读取异常"""
+    __slots__ = ("excluded_waves", "brush_waves", "error", "read_error")
+
+    def __init__(self, excluded_waves=frozenset(), brush_waves=frozenset(), error=None, read_error=None):
+        self.excluded_waves = frozenset(excluded_waves)
+        self.brush_waves = frozenset(brush_waves)
+        self.error = error
+        self.read_error = read_error
+
+
+def parse_sub_table(sub_table_path):
+    """读取副表数据sheet，检查重复数据并取出排除 / 刷单波次"""
+    try:
+        df_sub = pd.read_excel(sub_table_path, sheet_name="副表数据")
+        # 两列各去空、去首尾空格一次，重复检查和波次集合共用
+        stripped = {col: df_sub[col].dropna().astype(str).str.strip()
+                    for col in ('排除', '刷单') if col in df_sub.columns}
+        duplicate_messages = []
+
+        if '排除' in stripped and '刷单' in stripped:
+            common_values = set(stripped['排除']) & set(stripped['刷单'])
+            if common_values:
+                duplicate_messages.append(f"排除和刷单列存在重复数据: {', '.join(common_values)}")
+
+        for col, label in (('排除', "排除列"), ('刷单', "刷单列")):
+            if col in stripped:
+                duplicates = df_sub[col].duplicated()
+                if duplicates.any():
+                    dup_values = df_sub.loc[duplicates, col].dropna().unique()
+                    if len(dup_values) > 0:
+                        duplicate_messages.append(f"{label}中存在重复数据: {', '.join(map(str, dup_values))}")
+
+        if duplicate_messages:
+            return SubTableData(error="副表数据错误:\n" + "\n".join(duplicate_messages))
+
+        return SubTableData(
+            set(stripped['排除'].unique()) if '排除' in stripped else (),
+            set(stripped['刷单'].unique()) if '刷单' in stripped else (),
+        )
+    except Exception as e:
+        return SubTableData(read_error=str(e))
+
+
+def _file_state(file_path):
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_sub_table_data(sub_table_path):
+    """
+    取得副表解析结果，文件修改时间和大小都未变化时直接使用缓存
+
+    :return: SubTableData，副表不存在时返回None
+    """
+    key = os.path.abspath(sub_table_path)
+    try:
+        state = _file_state(key)
+    except OSError:
+        return None
+
+    with cache_lock:
+        cached = _sub_table_cache.get(key)
+    if cached is not None and cached[0] == state:
+        return cached[1]
+
+    data = parse_sub_table(key)
+    with cache_lock:
+        _sub_table_cache[key] = (state, data)
+    return data
+
+
+def clear_sub_table_cache():
+    """清空副表解析结果缓存，下次读取时重新解析"""
+    with cache_lock:
+        _sub_table_cache.clear()
+
+
+def watch_sub_table(sub_table_path, interval):
+    """副表保存后立即在后台重新解析，计算时直接命中缓存"""
+    last_state = None
+    while not stop_event.is_set():
+        try:
+            state = _file_state(sub_table_path)
+        except OSError:
+            state = None
+        if state is not None and state != last_state:
+            load_sub_table_data(sub_table_path)
+        last_state = state
+        stop_event.wait(interval)
+
+
+def start_sub_table_watcher(sub_table_path, interval=2.0):
+    """启动副表预读线程"""
+    global watcher_thread
+    with watcher_lock:
+        if watcher_thread and watcher_thread.is_alive():
+            return
+
+        watcher_thread = threading.Thread(
+            target=watch_sub_table,
+            args=(sub_table_path, interval),
+            daemon=True
+        )
+        stop_event.clear()
+        watcher_thread.start()
+
+
+def stop_sub_table_watcher():
+    """停止副表预读线程"""
+    global watcher_thread
+    with watcher_lock:
+        if watcher_thread and watcher_thread.is_alive():
+            stop_event.set()
+            watcher_thread.join(timeout=1)
+        watcher_thread = None
+        stop_event.clear()
 
 
 class SubTableHandler:
-    def __init__(self, desktop_path):
+    def __init__(self, desktop_path, sub_table_path=None):
         self.desktop_path = desktop_path
+        self.sub_table_path = sub_table_path or os.path.join(desktop_path, "副表.xlsx")
         self.excluded_waves = set()
         self.brush_waves = set()
         self.sub_table_messages = []
@@ -23,64 +161,59 @@ class SubTableHandler:
         return False
 
     def load_sub_table(self):
-        sub_table_path = os.path.join(self.desktop_path, "副表.xlsx")
+        sub_table_path = self.sub_table_path
         sub_table_exists = True
 
-        if os.path.exists(sub_table_path):
-            try:
-                df_sub = pd.read_excel(sub_table_path, sheet_name="副表数据")
-                duplicate_messages = []
-
-                if '排除' in df_sub.columns and '刷单' in df_sub.columns:
-                    common_values = set(df_sub['排除'].dropna().astype(str).str.strip()) & \
-                                    set(df_sub['刷单'].dropna().astype(str).str.strip())
-                    if common_values:
-                        duplicate_messages.append(f"排除和刷单列存在重复数据: {', '.join(common_values)}")
-
-                if '排除' in df_sub.columns:
-                    exclude_duplicates = df_sub['排除'].duplicated()
-                    if exclude_duplicates.any():
-                        dup_values = df_sub.loc[exclude_duplicates, '排除'].dropna().unique()
-                        if len(dup_values) > 0:
-                            duplicate_messages.append(f"排除列中存在重复数据: {', '.join(map(str, dup_values))}")
-
-                if '刷单' in df_sub.columns:
-                    brush_duplicates = df_sub['刷单'].duplicated()
-                    if brush_duplicates.any():
-                        dup_values = df_sub.loc[brush_duplicates, '刷单'].dropna().unique()
-                        if len(dup_values) > 0:
-                            duplicate_messages.append(f"刷单列中存在重复数据: {', '.join(map(str, dup_values))}")
-
-                if duplicate_messages:
-                    return "副表数据错误:\n" + "\n".join(duplicate_messages)
-
-                if '排除' in df_sub.columns:
-                    self.excluded_waves = set(df_sub['排除'].dropna().astype(str).str.strip().unique())
-                if '刷单' in df_sub.columns:
-                    self.brush_waves = set(df_sub['刷单'].dropna().astype(str).str.strip().unique())
-            except Exception as e:
-                self.sub_table_messages.append({"text": f"注意：读取副表时出错: {str(e)}", "color": self.COLOR_WARN})
-                sub_table_exists = False
-        else:
+        data = load_sub_table_data(sub_table_path)
+        if data is None:
             self.sub_table_messages.append({"text": "注意：副表不存在", "color": self.COLOR_WARN})
             sub_table_exists = False
+        elif data.read_error is not None:
+            self.sub_table_messages.append({"text": f"注意：读取副表时出错: {data.read_error}", "color": self.COLOR_WARN})
+            sub_table_exists = False
+        elif data.error:
+            return data.error
+        else:
+            self.excluded_waves = set(data.excluded_waves)
+            self.brush_waves = set(data.brush_waves)
 
         if sub_table_exists and not (self.excluded_waves or self.brush_waves):
             self.sub_table_messages.append({"text": "注意：副表无有效波次数据", "color": self.COLOR_WARN})
 
         return None
 
-    def is_excluded_wave(self, wave_str):
-        if wave_str in self.excluded_waves:
-            self.processed_excluded_waves.add(wave_str)
-            return True
-        return False
-
-    def is_brush_wave(self, wave_str):
-        if wave_str in self.brush_waves:
-            self.processed_brush_waves.add(wave_str)
-            return True
-        return False
+    def classify_waves(self, waves, non_today_waves=()):
+        """
+        批量判断波次分类，优先级：非当天 > 排除 > 刷单 > 普通
+
+        :param waves: 不同波次的序列（空波次为None）
+        :return: 与 waves 等长的 np.int8 数组，取值为 WAVE_NORMAL / WAVE_EXCLUDED / WAVE_BRUSH / WAVE_NON_TODAY
+        """
+        classification = {}
+        for wave in non_today_waves:
+            classification[wave] = WAVE_NON_TODAY
+        for wave in self.brush_waves:
+            classification.setdefault(wave, WAVE_BRUSH)
+        for wave in self.excluded_waves:
+            if classification.get(wave) != WAVE_NON_TODAY:
+                classification[wave] = WAVE_EXCLUDED
+        return np.fromiter((classification.get(wave, WAVE_NORMAL) for wave in waves), dtype=np.int8, count=len(waves))
+
+    def split_processed(self, waves):
+        """
+        从实际处理到的波次中取出排除波次和刷单波次
+
+        :return: (排除波次集合, 刷单波次集合)
+        """
+        waves = set(waves)
+        excluded = waves & self.excluded_waves
+        return excluded, (waves & self.brush_waves) - excluded
+
+    def mark_processed(self, waves):
+        """把实际处理到的波次一次性计入已处理的排除 / 刷单波次"""
+        excluded, brush = self.split_processed(waves)
+        self.processed_excluded_waves |= excluded
+        self.processed_brush_waves |= brush
 
     def get_warnings(self):
         warnings = []
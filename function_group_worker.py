@@ -0,0 +1,56 @@
+# function_group_worker.py
+"""
+分组计算后台线程
+
+在 QThread 中运行 ExcelContrastProcessor.process()，界面线程不再被阻塞。
+通过信号报告各阶段进度（读取参考数据 / 读取并映射订单 / 汇总 / 写出结果）和最终结果，
+cancel() 后在下一个进度点停止计算。
+传入 GroupCalculationService 时由服务执行，复用其保留的参考数据和解析结果。
+"""
+import threading
+import time
+
+from PySide6.QtCore import QThread, Signal
+
+from function_group_calculation import ExcelContrastProcessor, STAGE_NAMES
+
+
+class GroupCalculationWorker(QThread):
+    # 阶段名称, 已读取行数（-1 表示不适用）
+    progress = Signal(str, int)
+    # 是否成功, 信息, 用时（秒）
+    completed = Signal(bool, str, float)
+
+    def __init__(self, service=None, parent=None):
+        super().__init__(parent)
+        self.service = service
+        self.cancel_event = threading.Event()
+        self.start_time = time.time()
+
+    def cancel(self):
+        """请求取消，计算在下一个进度点停止"""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def _on_progress(self, stage, rows):
+        self.progress.emit(STAGE_NAMES.get(stage, stage), -1 if rows is None else int(rows))
+
+    def run(self):
+        self.start_time = time.time()
+        try:
+            if self.service is not None:
+                success, message = self.service.run(self._on_progress, self.cancel_event)
+            else:
+                processor = ExcelContrastProcessor()
+                processor.progress_callback = self._on_progress
+                processor.cancel_event = self.cancel_event
+                success, message = processor.process()
+        except Exception as e:
+            success, message = False, f"分组计算执行出错: {str(e)}"
+        self.completed.emit(success, message, self.elapsed())
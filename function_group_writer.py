@@ -0,0 +1,211 @@
+# function_group_writer.py
+"""
+分组计算结果写出后端
+
+create_output_excel 把排序后的结果行和提示消息交给写出后端生成 输出结果.xlsx，
+各后端的内容、颜色、列宽一致：
+- xlsxwriter：constant_memory 模式逐行写出，每种颜色的格式只注册一次（默认）
+- openpyxl：逐单元格写出，未安装 xlsxwriter 时使用
+
+结果行为元组 (订单渠道, 订单类型, 款式, 单量, 实际数量, 未匹配标记, 空值行标记)，
+渠道 / 类型颜色为 {值: RGB字符串}。
+write() 写出单个「汇总结果」sheet；write_sheets() 依次写出多个 sheet（日期范围模式），各 sheet 格式相同。
+"""
+import numbers
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+SHEET_TITLE = "汇总结果"
+HEADERS = ["订单渠道", "订单类型", "款式", "单量", "实际数量"]
+HEADER_FONT_COLOR = "FFFFFF"
+HEADER_FILL_COLOR = "9999FF"
+COLUMN_WIDTHS = {'A': 15, 'B': 15, 'C': 30, 'D': 10, 'E': 15}
+# 提示消息颜色
+MESSAGE_COLORS = {
+    "green": "00AA00",
+    "purple": "800080",
+    "red": "FF0000"
+}
+# 款式、单量、实际数量三列标红的行
+HIGHLIGHT_COLOR = "FF0000"
+PARTIAL_UNMATCHED_STYLE = "（未匹配到部分编码）"
+
+
+def font_rgb(font):
+    """取 openpyxl Font 的 RGB 颜色字符串，无颜色时返回None"""
+    color = font.color if font is not None else None
+    rgb = getattr(color, "rgb", None)
+    return rgb if isinstance(rgb, str) else None
+
+
+def is_highlighted(row):
+    """空值行、未匹配编码行和部分编码未匹配的行标红"""
+    return row[6] or row[5] or row[2] == PARTIAL_UNMATCHED_STYLE
+
+
+def write_value(ws, row, col, value, cell_format=None):
+    """
+    xlsxwriter 按值的类型写出一个单元格
+
+    字符串一律写为文本，以 = 开头或形如网址的字符串不会变成公式、超链接；数值写为数字。
+    """
+    if isinstance(value, str):
+        ws.write_string(row, col, value, cell_format)
+    elif isinstance(value, numbers.Number) and not isinstance(value, bool):
+        ws.write_number(row, col, value, cell_format)
+    elif value is None:
+        ws.write_blank(row, col, None, cell_format)
+    else:
+        ws.write(row, col, value, cell_format)
+
+
+def as_text(cell):
+    """openpyxl 把以 = 开头的字符串当作公式，改回文本，与 xlsxwriter 后端一致"""
+    if cell.data_type == "f":
+        cell.data_type = "s"
+    return cell
+
+
+class OpenpyxlResultWriter:
+    name = "openpyxl"
+
+    def write(self, output_path, rows, messages, channel_colors, order_type_colors):
+        return self.write_sheets(output_path, [(SHEET_TITLE, rows, messages)], channel_colors, order_type_colors)
+
+    def write_sheets(self, output_path, sheets, channel_colors, order_type_colors):
+        """
+        :param sheets: [(sheet名称, 结果行, 提示消息), ...]，按顺序写出
+        """
+        wb = Workbook()
+
+        fonts = {}
+
+        def font(rgb, bold=False):
+            key = (rgb, bold)
+            if key not in fonts:
+                fonts[key] = Font(color=rgb, bold=bold)
+            return fonts[key]
+
+        for index, (title, rows, messages) in enumerate(sheets):
+            ws = wb.active if index == 0 else wb.create_sheet()
+            ws.title = title
+            self._write_sheet(ws, rows, messages, channel_colors, order_type_colors, font)
+
+        wb.save(output_path)
+        return output_path
+
+    @staticmethod
+    def _write_sheet(ws, rows, messages, channel_colors, order_type_colors, font):
+        ws.append(HEADERS)
+        header_fill = PatternFill(start_color=HEADER_FILL_COLOR, end_color=HEADER_FILL_COLOR, fill_type="solid")
+        for cell in ws[1]:
+            cell.font = font(HEADER_FONT_COLOR, True)
+            cell.fill = header_fill
+
+        for row_number, row in enumerate(rows, start=2):
+            for col, value in enumerate(row[:5], start=1):
+                as_text(ws.cell(row=row_number, column=col, value=value))
+            if is_highlighted(row):
+                for col in range(3, 6):
+                    ws.cell(row=row_number, column=col).font = font(HIGHLIGHT_COLOR)
+            if row[0] in channel_colors:
+                ws.cell(row=row_number, column=1).font = font(channel_colors[row[0]])
+            if row[1] in order_type_colors:
+                ws.cell(row=row_number, column=2).font = font(order_type_colors[row[1]])
+
+        ws.append([])
+
+        for msg in messages:
+            if isinstance(msg, dict):
+                ws.append([msg["text"]])
+                rgb = MESSAGE_COLORS.get(msg["color"])
+                ws.cell(row=ws.max_row, column=1).font = font(rgb) if rgb else Font()
+            else:
+                ws.append([msg])
+            as_text(ws.cell(row=ws.max_row, column=1))
+
+        for col, width in COLUMN_WIDTHS.items():
+            ws.column_dimensions[col].width = width
+
+
+class XlsxwriterResultWriter:
+    name = "xlsxwriter"
+
+    def write(self, output_path, rows, messages, channel_colors, order_type_colors):
+        return self.write_sheets(output_path, [(SHEET_TITLE, rows, messages)], channel_colors, order_type_colors)
+
+    def write_sheets(self, output_path, sheets, channel_colors, order_type_colors):
+        """
+        :param sheets: [(sheet名称, 结果行, 提示消息), ...]，按顺序逐个写完
+        """
+        workbook = xlsxwriter.Workbook(output_path, {"constant_memory": True})
+        try:
+            formats = {}
+
+            def color_format(rgb):
+                # 只取后6位，兼容带透明度的8位颜色
+                if rgb not in formats:
+                    formats[rgb] = workbook.add_format({"font_color": "#" + rgb[-6:]})
+                return formats[rgb]
+
+            channel_formats = {value: color_format(rgb) for value, rgb in channel_colors.items()}
+            type_formats = {value: color_format(rgb) for value, rgb in order_type_colors.items()}
+            highlight = color_format(HIGHLIGHT_COLOR)
+            message_formats = {name: color_format(rgb) for name, rgb in MESSAGE_COLORS.items()}
+            header_format = workbook.add_format({
+                "font_color": "#" + HEADER_FONT_COLOR,
+                "bold": True,
+                "pattern": 1,
+                "bg_color": "#" + HEADER_FILL_COLOR
+            })
+
+            for title, rows, messages in sheets:
+                ws = workbook.add_worksheet(title)
+
+                # 按像素设置列宽，使列宽与 openpyxl 写出的 width 数值一致
+                for col, width in COLUMN_WIDTHS.items():
+                    index = ord(col) - ord('A')
+                    ws.set_column_pixels(index, index, width * 7)
+
+                # constant_memory 模式下必须按行顺序写入
+                ws.write_row(0, 0, HEADERS, header_format)
+
+                row_index = 0
+                for row in rows:
+                    row_index += 1
+                    write_value(ws, row_index, 0, row[0], channel_formats.get(row[0]))
+                    write_value(ws, row_index, 1, row[1], type_formats.get(row[1]))
+                    value_format = highlight if is_highlighted(row) else None
+                    for col in range(2, 5):
+                        write_value(ws, row_index, col, row[col], value_format)
+
+                # 结果与消息之间空一行
+                row_index += 1
+                for msg in messages:
+                    row_index += 1
+                    if isinstance(msg, dict):
+                        write_value(ws, row_index, 0, msg["text"], message_formats.get(msg["color"]))
+                    else:
+                        write_value(ws, row_index, 0, msg)
+        finally:
+            workbook.close()
+        return output_path
+
+
+WRITERS = {
+    OpenpyxlResultWriter.name: OpenpyxlResultWriter,
+    XlsxwriterResultWriter.name: XlsxwriterResultWriter,
+}
+
+
+def get_writer(name="xlsxwriter"):
+    """按名称取得写出后端，xlsxwriter 未安装或名称未知时使用 openpyxl"""
+    if name == XlsxwriterResultWriter.name and xlsxwriter is None:
+        name = OpenpyxlResultWriter.name
+    return WRITERS.get(name, OpenpyxlResultWriter)()
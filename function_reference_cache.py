@@ -0,0 +1,110 @@
+# function_reference_cache.py
+"""
+编码对应关系缓存模块
+
+将解析好的参考数据（编码字典、优先级、款式排序、映射表、颜色字体等）以 pickle
+保存在配置目录下。源文件的修改时间、大小或内容哈希任一变化即视为失效，
+未变化时直接读取缓存，跳过 Excel 解析。
+读取或保存过的参考数据同时留在内存中，源文件修改时间和大小都未变化时
+不再计算哈希、不再读取 pickle。
+"""
+import hashlib
+import os
+import pickle
+import threading
+
+from function_config_manager import get_config_path
+
+# 缓存格式变化时递增，旧缓存自动失效
+CACHE_VERSION = 1
+
+# 内存中的参考数据 {源文件路径: ((修改时间, 大小), 签名, 数据)}
+_memory_cache = {}
+memory_lock = threading.Lock()
+
+
+def clear_memory_cache():
+    """清空内存中的参考数据，下次读取时重新校验缓存文件"""
+    with memory_lock:
+        _memory_cache.clear()
+
+
+def get_cache_dir():
+    """缓存目录：配置文件所在目录下的 cache"""
+    return get_config_path().parent / "cache"
+
+
+def file_signature(file_path):
+    """返回 (修改时间, 大小, 内容哈希)"""
+    stat = os.stat(file_path)
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return stat.st_mtime_ns, stat.st_size, digest.hexdigest()
+
+
+class ReferenceCache:
+    def __init__(self, source_path, cache_dir=None):
+        self.source_path = os.path.abspath(source_path)
+        cache_dir = cache_dir or get_cache_dir()
+        name = hashlib.sha1(self.source_path.encode('utf-8')).hexdigest()[:12]
+        self.cache_path = os.path.join(cache_dir, f"reference_{name}.pkl")
+        self._signature = None
+        self._state = None
+
+    def _file_state(self):
+        if self._state is None:
+            stat = os.stat(self.source_path)
+            self._state = (stat.st_mtime_ns, stat.st_size)
+        return self._state
+
+    def _remember(self, data):
+        with memory_lock:
+            _memory_cache[self.source_path] = (self._file_state(), self.signature(), data)
+
+    def signature(self):
+        if self._signature is None:
+            self._signature = file_signature(self.source_path)
+        return self._signature
+
+    def load(self):
+        """读取缓存，源文件不存在、缓存缺失或已失效时返回None"""
+        try:
+            state = self._file_state()
+        except OSError:
+            return None
+        with memory_lock:
+            remembered = _memory_cache.get(self.source_path)
+        if remembered is not None and remembered[0] == state:
+            self._signature = remembered[1]
+            return remembered[2]
+
+        try:
+            signature = self.signature()
+            with open(self.cache_path, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception:
+            return None
+
+        if cached.get("version") != CACHE_VERSION or cached.get("signature") != signature:
+            return None
+        data = cached.get("data")
+        self._remember(data)
+        return data
+
+    def save(self, data):
+        """写入缓存，失败时只打印提示，不影响计算"""
+        try:
+            payload = {"version": CACHE_VERSION, "signature": self.signature(), "data": data}
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"保存编码对应关系缓存失败: {str(e)}")
+        try:
+            self._remember(data)
+        except OSError:
+            pass
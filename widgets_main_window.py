@@ -9,6 +9,7 @@
 - Excel对比功能
 - 系统托盘控制
 """
+import os
 import time
 
 from function_counter import counter_manager
@@ -18,7 +19,9 @@ from function_checkColor import start_monitoring, stop_monitoring
 import function_switch2
 from function_keyboard_manager import keyboard_manager
 from function_config_manager import load_config, save_config, update_ocr_config
-from function_group_calculation import group_calculation
+from function_group_worker import GroupCalculationWorker
+from function_group_service import GroupCalculationService
+from function_group_sub_table import start_sub_table_watcher, stop_sub_table_watcher
 import re
 from PySide6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit, \
     QMessageBox
@@ -119,6 +122,11 @@ class ModernWindow(DraggableMixin, FrostedGlassWidget):
 
         self.config = load_config()
         self.switch_buttons = []
+        # 分组计算后台线程，运行时不为None
+        self.group_worker = None
+        self.group_stage_text = ""
+        # 常驻的分组计算服务，多次计算之间保留参考数据和解析结果
+        self.group_service = GroupCalculationService()
 
         self._setup_window_properties()
         self._init_ui()  # 先初始化UI
@@ -129,6 +137,11 @@ class ModernWindow(DraggableMixin, FrostedGlassWidget):
 
         self._init_refresh_timer()
 
+        # 副表保存后在后台预读，分组计算时直接使用
+        if self.config.get("group_preload", True):
+            start_sub_table_watcher(os.path.join(os.path.expanduser("~"), "Desktop", "副表.xlsx"))
+            self.group_service.warm_up()
+
         # 连接键盘信号
         keyboard_manager.left_key_pressed.connect(self._handle_left_key)
         keyboard_manager.right_key_pressed.connect(self._handle_right_key)
@@ -142,6 +155,7 @@ class ModernWindow(DraggableMixin, FrostedGlassWidget):
         today, session = counter_manager.get_counts()
         self.today_label.setText(f"今日录入数量：{today}")
         self.session_label.setText(f"本次录入数量：{session}")
+        self._refresh_group_status()
 
         # 计算并显示录入速度
         speed = counter_manager.calculate_speed()
@@ -240,6 +254,7 @@ class ModernWindow(DraggableMixin, FrostedGlassWidget):
         self._create_switches(main_layout)  # 功能开关组
         main_layout.addStretch()  # 弹性空间
         main_layout.addLayout(self._create_action_button())  # 功能按钮
+        main_layout.addWidget(self._create_group_status())  # 分组计算进度
         main_layout.addLayout(self._create_bottom_input())  # 底部输入区
 
         self.setLayout(main_layout)
@@ -371,11 +386,19 @@ class ModernWindow(DraggableMixin, FrostedGlassWidget):
         excel_btn_new.setStyleSheet(self.BUTTON_STYLE["action"])
         excel_btn_new.setCursor(Qt.CursorShape.PointingHandCursor)
         excel_btn_new.clicked.connect(self.on_group_calculation)
+        self.group_button = excel_btn_new
 
         button_layout.addWidget(create_table_btn)  # 使用新按钮
         button_layout.addWidget(excel_btn_new)
         return button_layout
 
+    def _create_group_status(self):
+        """创建分组计算进度标签（计算开始后显示）"""
+        self.group_status_label = _create_stat_label("")
+        self.group_status_label.setWordWrap(True)
+        self.group_status_label.hide()
+        return self.group_status_label
+
     def _create_bottom_input(self):
         """创建底部输入区域"""
         bottom_layout = QVBoxLayout()
@@ -483,15 +506,61 @@ class ModernWindow(DraggableMixin, FrostedGlassWidget):
 
     @Slot()
     def on_group_calculation(self):
-        """分组计算按钮点击回调"""
+        """分组计算按钮点击回调：在后台线程计算，计算中再次点击则取消"""
+        if self.group_worker is not None:
+            self.group_worker.cancel()
+            self.group_button.setText("正在取消…")
+            self.group_button.setEnabled(False)
+            return
+
         try:
-            success, message = group_calculation()
-            if not success:
-                # 如果有错误消息，显示弹窗
-                self.show_message("警告", message, QMessageBox.Warning)
+            worker = GroupCalculationWorker(self.group_service, self)
+            worker.progress.connect(self.on_group_progress)
+            worker.completed.connect(self.on_group_completed)
+            # 线程结束后释放，on_group_completed 中已不再引用
+            worker.finished.connect(worker.deleteLater)
+            self.group_worker = worker
+            self.group_button.setText("取消计算")
+            self.group_stage_text = "准备中"
+            self.group_status_label.show()
+            self._refresh_group_status()
+            worker.start()
         except Exception as e:
+            self.group_worker = None
             self.show_message("错误", f"分组计算执行出错: {str(e)}", QMessageBox.Critical)
 
+    @Slot(str, int)
+    def on_group_progress(self, stage, rows):
+        """分组计算进度回调"""
+        if self.group_worker is None:
+            return
+        rows_text = f"，已读取 {rows} 行" if rows >= 0 else ""
+        self.group_stage_text = f"{stage}{rows_text}"
+        self._refresh_group_status()
+
+    def _refresh_group_status(self):
+        """刷新分组计算的阶段和已用时间"""
+        if self.group_worker is not None:
+            self.group_status_label.setText(
+                f"分组计算：{self.group_stage_text}（{self.group_worker.elapsed():.1f} 秒）")
+
+    @Slot(bool, str, float)
+    def on_group_completed(self, success, message, elapsed):
+        """分组计算结束回调"""
+        worker = self.group_worker
+        self.group_worker = None
+        self.group_button.setText("分组计算")
+        self.group_button.setEnabled(True)
+
+        if worker is not None and worker.cancelled:
+            self.group_status_label.setText(f"分组计算已取消（{elapsed:.1f} 秒）")
+        elif success:
+            self.group_status_label.setText(f"分组计算完成，用时 {elapsed:.2f} 秒")
+        else:
+            self.group_status_label.setText(f"分组计算失败（{elapsed:.1f} 秒）")
+            # 如果有错误消息，显示弹窗
+            self.show_message("警告", message, QMessageBox.Warning)
+
     # ------------------------ 辅助方法 ------------------------
     def _safe_stop(self, stop_func, name):
         """
@@ -519,12 +588,22 @@ class ModernWindow(DraggableMixin, FrostedGlassWidget):
 
         super().closeEvent(event)
 
+    def _stop_group_worker(self):
+        """取消正在进行的分组计算并等待线程结束"""
+        worker = self.group_worker
+        if worker is not None and worker.isRunning():
+            worker.cancel()
+            worker.wait(5000)
+
     def _stop_all_services(self):
         """集中停止所有服务"""
         services = [
+            (self._stop_group_worker, "分组计算"),
             (function_switch2.stop_monitoring, "自动入库"),
             (stop_monitoring, "OCR监控"),
-            (lambda: keyboard_manager.disable_all(), "键盘映射")
+            (lambda: keyboard_manager.disable_all(), "键盘映射"),
+            (stop_sub_table_watcher, "副表预读"),
+            (self.group_service.stop, "分组计算预热")
         ]
 
         for func, name in services: